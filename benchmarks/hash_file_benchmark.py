@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the throughput of :func:`douglib.core.hash_file` and
+:func:`douglib.core.hash_file_multi` on a large file.
+
+Usage::
+
+    python benchmarks/hash_file_benchmark.py [--size-mb 1024] [--repeat 3]
+
+A file of random data is written to a temporary directory, so make sure
+there's enough free space. Run it twice to see warm-cache numbers.
+"""
+# ---------------------------------------------------------------------------
+### Imports
+# ---------------------------------------------------------------------------
+# Standard Library
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+# Third-Party
+
+# Package / Application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+from douglib import core                            # noqa
+
+
+def naive_hash(path, names, blocksize=65536):
+    """ One pass per hasher, allocating a new buffer for every block. """
+    digests = []
+    for name in names:
+        hasher = hashlib.new(name)
+        with open(path, 'rb') as openf:
+            buf = openf.read(blocksize)
+            while buf:
+                hasher.update(buf)
+                buf = openf.read(blocksize)
+        digests.append(hasher.digest())
+    return digests
+
+
+def hash_file_path(path, hasher):
+    """ Hash the file ``path`` with :func:`douglib.core.hash_file`. """
+    with open(path, 'rb') as openf:
+        return core.hash_file(openf, hasher)
+
+
+def write_test_file(path, size_mb):
+    """ Write ``size_mb`` MiB of random data to ``path``. """
+    block = os.urandom(2**20)
+    with open(path, 'wb') as openf:
+        for _ in range(size_mb):
+            openf.write(block)
+
+
+def best_time(func, repeat):
+    """ Return the shortest of ``repeat`` runs of ``func()``, in seconds. """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """ Run the benchmark and print a table of throughputs. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size-mb", type=int, default=1024,
+                        help="the size of the test file, in MiB")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="the number of runs of each case")
+    args = parser.parse_args()
+
+    cases = (
+        ("naive, md5", lambda p: naive_hash(p, ['md5'])),
+        ("hash_file, md5", lambda p: hash_file_path(p, hashlib.md5())),
+        ("naive, md5 + sha256", lambda p: naive_hash(p, ['md5', 'sha256'])),
+        ("hash_file_multi, md5 + sha256",
+         lambda p: core.hash_file_multi(p, ['md5', 'sha256'])),
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "data.bin")
+        write_test_file(path, args.size_mb)
+        # Warm the page cache so every case reads from memory.
+        naive_hash(path, ['md5'])
+
+        print("{:<32}{:>10}{:>12}".format("case", "seconds", "MiB/s"))
+        for name, func in cases:
+            seconds = best_time(lambda: func(path), args.repeat)
+            print("{:<32}{:>10.3f}{:>12.1f}".format(name, seconds,
+                                                    args.size_mb / seconds))
+
+
+if __name__ == "__main__":
+    main()
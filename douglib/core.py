@@ -14,6 +14,16 @@ import os
 import random
 import operator
 import hashlib
+import re
+import io
+import weakref
+import time
+import concurrent.futures
+import warnings
+import csv
+import itertools
+import sqlite3
+import threading
 
 # Third-Party
 import numpy as np
@@ -30,6 +40,867 @@ from .utils import DougLibError
 # Defined by SEMI M1-0302
 FLAT_LENGTHS = {50: 15.88, 75: 22.22, 100: 32.5, 125: 42.5, 150: 57.5}
 
+# Record layout of a ``(row, column, data)`` wafer map.
+RCD_DTYPE = np.dtype([('row', np.int32),
+                      ('col', np.int32),
+                      ('data', np.float64),
+                      ])
+
+# Order-of-magnitude prefixes
+SI_PREFIXES = {"y": 1e-24,
+               "z": 1e-21,
+               "a": 1e-18,
+               "f": 1e-15,
+               "p": 1e-12,
+               "n": 1e-9,
+               "u": 1e-6,
+               "m": 1e-3,
+               "c": 1e-2,
+               "d": 1e-1,
+               "da": 1e1,
+               "": 1e0,
+               "h": 1e2,
+               "k": 1e3,
+               "M": 1e6,
+               "G": 1e9,
+               "T": 1e12,
+               "P": 1e15,
+               "E": 1e18,
+               "Z": 1e21,
+               "Y": 1e24}
+
+_DIGITS = frozenset("0123456789")
+
+# The prefixes for 10**-24 through 10**24, in steps of 10**3.
+_ENGINEERING_PREFIXES = ("y", "z", "a", "f", "p", "n", "u", "m", "",
+                         "k", "M", "G", "T", "P", "E", "Z", "Y")
+
+# A number with an optional order-of-magnitude prefix, such as "-1.23e2m".
+_ENGINEERING_RE = re.compile(r"""
+\s*
+([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)    # the number
+\s*
+(da|[yzafpnumcdhkMGTPEZY]?)                  # the prefix
+\s*$
+""", re.VERBOSE)
+
+# {symbol: (SI base unit, scale)} of the units known to UnitRegistry
+DEFAULT_UNITS = {"V": ("V", 1),
+                 "A": ("A", 1),
+                 "Ohm": ("Ohm", 1),
+                 "ohm": ("Ohm", 1),
+                 "\u03a9": ("Ohm", 1),
+                 "S": ("S", 1),
+                 "F": ("F", 1),
+                 "H": ("H", 1),
+                 "Hz": ("Hz", 1),
+                 "W": ("W", 1),
+                 "J": ("J", 1),
+                 "C": ("C", 1),
+                 "s": ("s", 1),
+                 }
+
+# Matches one Reedholm die name ("x27y54") per line.
+_REEDHOLM_DIE_RE = re.compile(r"^x(-?\d+|)y(-?\d+|)$", re.MULTILINE)
+
+
+# ---------------------------------------------------------------------------
+### Classes
+# ---------------------------------------------------------------------------
+class RadialProfile(object):
+    """
+    Accumulate binned radial statistics of wafer data.
+
+    Die values are binned into rings of width ``bin_width`` by the radius
+    of the die center. Only running per-ring totals are kept, so any number
+    of wafers can be added without keeping their data. Profiles built in
+    different processes can be combined with :meth:`merge`.
+
+    Medians need the distribution of values in each ring. They are
+    estimated from a per-ring histogram of ``value_bins`` bins over
+    ``value_range``, which is only kept if ``value_range`` is given.
+
+    Parameters
+    ----------
+    bin_width : numeric, optional
+        The width of each ring, in the same units as the die size.
+    value_range : sequence of numerics, length 2, optional
+        The ``(min, max)`` of the value histogram used for medians. Values
+        outside the range are counted in the first or last bin.
+    value_bins : int, optional
+        The number of value histogram bins.
+    skipna : bool, optional [True]
+        If ``True``, NaN values are ignored. Otherwise they propagate to
+        the mean, std and median of their ring.
+
+    Attributes
+    ----------
+    count : ndarray of ints
+        The number of values in each ring.
+    weight : ndarray of floats
+        The sum of the weights in each ring.
+    total : ndarray of floats
+        The weighted sum of the values in each ring.
+    total_sqrd : ndarray of floats
+        The weighted sum of the squared values in each ring.
+    histogram : ndarray of floats or None
+        The weighted ``(ring, value_bin)`` histogram.
+
+    Methods
+    -------
+    add(self, rcd, die_xy, center_rc, weights=None)
+        Add the values of a wafer.
+    merge(self, other)
+        Add the totals of another RadialProfile.
+    result(self)
+        Return the per-ring statistics.
+
+    Examples
+    --------
+    >>> profile = RadialProfile(bin_width=1)
+    >>> profile.add([(0, 0, 1.0), (0, 1, 3.0), (0, 3, 5.0)], (1, 1), (0, 0))
+    >>> profile.add([(0, 0, 2.0), (0, 3, np.nan)], (1, 1), (0, 0))
+    >>> stats = profile.result()
+    >>> stats['count']
+    array([2, 1, 0, 1])
+    >>> stats['mean']
+    array([1.5, 3. , nan, 5. ])
+    """
+    def __init__(self, bin_width=1, value_range=None, value_bins=256,
+                 skipna=True):
+        self.bin_width = bin_width
+        if value_range is not None:
+            value_range = tuple(map(float, value_range))
+        self.value_range = value_range
+        self.value_bins = value_bins
+        self.skipna = skipna
+        self.count = np.zeros(0, dtype=np.int64)
+        self.weight = np.zeros(0)
+        self.total = np.zeros(0)
+        self.total_sqrd = np.zeros(0)
+        self.histogram = None
+        if value_range is not None:
+            self.histogram = np.zeros((0, value_bins))
+
+    def _grow(self, nbins):
+        """ Extend the per-ring arrays to at least ``nbins`` rings. """
+        extra = nbins - len(self.count)
+        if extra <= 0:
+            return
+        self.count = np.concatenate((self.count,
+                                     np.zeros(extra, dtype=np.int64)))
+        self.weight = np.concatenate((self.weight, np.zeros(extra)))
+        self.total = np.concatenate((self.total, np.zeros(extra)))
+        self.total_sqrd = np.concatenate((self.total_sqrd, np.zeros(extra)))
+        if self.histogram is not None:
+            self.histogram = np.concatenate(
+                (self.histogram, np.zeros((extra, self.value_bins))))
+
+    def add(self, rcd, die_xy, center_rc, weights=None):
+        """
+        Add the values of a wafer.
+
+        Parameters
+        ----------
+        rcd : list of tuples or ndarray
+            The ``(row, column, value)`` data of the wafer.
+        die_xy : sequence of numerics, length 2
+            The die ``(x, y)`` size.
+        center_rc : sequence of numerics, length 2
+            The grid ``(row, column)`` coordinate of the wafer center.
+        weights : array-like, optional
+            A weight for each value.
+
+        Returns
+        -------
+        None
+        """
+        ring, values, weights = _radial_bins(rcd, die_xy, center_rc,
+                                             self.bin_width, weights,
+                                             self.skipna)
+        if ring.size == 0:
+            return
+        nbins = ring.max() + 1
+        self._grow(nbins)
+        self.count[:nbins] += np.bincount(ring, minlength=nbins)
+        self.weight[:nbins] += np.bincount(ring, weights, nbins)
+        self.total[:nbins] += np.bincount(ring, weights * values, nbins)
+        self.total_sqrd[:nbins] += np.bincount(ring, weights * values**2,
+                                               nbins)
+
+        if self.histogram is not None:
+            # NaN values make their ring's median NaN in result() instead.
+            valid = ~np.isnan(values)
+            ring, values, weights = ring[valid], values[valid], weights[valid]
+            low, high = self.value_range
+            value_bin = (values - low) * (self.value_bins / (high - low))
+            value_bin = np.clip(np.nan_to_num(value_bin), 0,
+                                self.value_bins - 1).astype(np.intp)
+            self.histogram[:nbins] += np.bincount(
+                ring * self.value_bins + value_bin, weights,
+                nbins * self.value_bins).reshape(nbins, self.value_bins)
+
+    def merge(self, other):
+        """
+        Add the totals of another RadialProfile to this one.
+
+        Parameters
+        ----------
+        other : RadialProfile
+            A profile with the same ``bin_width`` and value histogram
+            settings.
+
+        Returns
+        -------
+        None
+        """
+        if (other.bin_width != self.bin_width
+                or other.value_range != self.value_range
+                or other.value_bins != self.value_bins):
+            raise ValueError("Profiles must use the same bins to be merged.")
+        nbins = len(other.count)
+        self._grow(nbins)
+        self.count[:nbins] += other.count
+        self.weight[:nbins] += other.weight
+        self.total[:nbins] += other.total
+        self.total_sqrd[:nbins] += other.total_sqrd
+        if self.histogram is not None:
+            self.histogram[:nbins] += other.histogram
+
+    def result(self):
+        """
+        Return the per-ring statistics.
+
+        Returns
+        -------
+        stats : dict of ndarrays
+            ``'radius'`` (the center of each ring), ``'count'``,
+            ``'weight'``, ``'mean'``, ``'std'`` (population standard
+            deviation) and ``'median'``. Empty rings have NaN statistics.
+            ``'median'`` is all NaN unless ``value_range`` was given.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.total / self.weight
+            var = self.total_sqrd / self.weight - mean**2
+        std = np.sqrt(np.maximum(var, 0))
+        std[np.isnan(var)] = np.nan
+
+        median = np.full(len(self.count), np.nan)
+        if self.histogram is not None:
+            median = _histogram_median(self.histogram, self.value_range)
+            median[np.isnan(self.total)] = np.nan
+
+        return {'radius': (np.arange(len(self.count)) + 0.5) * self.bin_width,
+                'count': self.count.copy(),
+                'weight': self.weight.copy(),
+                'mean': mean,
+                'std': std,
+                'median': median,
+                }
+
+
+class StackedMap(object):
+    """
+    Accumulate per-die statistics over a stack of wafer maps.
+
+    Wafers are added one at a time, and only running per-die totals are
+    kept in arrays allocated up front, so a lot (or a month) of wafers can
+    be stacked while holding a single wafer in memory. Stacks built in
+    different processes can be combined with :meth:`merge`.
+
+    Parameters
+    ----------
+    shape : tuple of ints, length 2
+        The ``(rows, cols)`` shape of the wafer maps.
+
+    Attributes
+    ----------
+    count : ndarray of ints
+        The number of values added for each die.
+    total : ndarray of floats
+        The sum of the values of each die.
+    total_sqrd : ndarray of floats
+        The sum of the squared values of each die.
+    tested : ndarray of ints
+        The number of wafers with a pass/fail result for each die.
+    passed : ndarray of ints
+        The number of passing results for each die.
+
+    Methods
+    -------
+    add(self, values=None, passed=None, missing=None)
+        Add a wafer.
+    merge(self, other)
+        Add the totals of another StackedMap.
+    result(self)
+        Return the per-die statistics.
+
+    Examples
+    --------
+    >>> stack = StackedMap((1, 3))
+    >>> stack.add([[1.0, 2.0, np.nan]], passed=[[True, False, True]])
+    >>> stack.add([[3.0, 2.0, 5.0]], passed=[[True, True, False]])
+    >>> stats = stack.result()
+    >>> stats['mean']
+    array([[2., 2., 5.]])
+    >>> stats['yield']
+    array([[1. , 0.5, 0.5]])
+    """
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.total = np.zeros(self.shape)
+        self.total_sqrd = np.zeros(self.shape)
+        self.tested = np.zeros(self.shape, dtype=np.int64)
+        self.passed = np.zeros(self.shape, dtype=np.int64)
+
+    def _check_shape(self, array):
+        """ Raise ValueError if ``array`` isn't the shape of the stack. """
+        if array.shape != self.shape:
+            err_txt = "Expected a map of shape {}; got {}."
+            raise ValueError(err_txt.format(self.shape, array.shape))
+
+    def add(self, values=None, passed=None, missing=None):
+        """
+        Add a wafer.
+
+        Parameters
+        ----------
+        values : 2D array-like of numerics, optional
+            A value for each die. NaN values are skipped.
+        passed : 2D array-like of bools, optional
+            The pass/fail result of each die, for the yield.
+        missing : 2D array-like of bools, optional
+            ``True`` for dies that weren't tested on this wafer. They are
+            skipped for both ``values`` and ``passed``.
+
+        Returns
+        -------
+        None
+        """
+        if values is None and passed is None:
+            raise ValueError("At least one of values or passed is needed.")
+        tested = np.ones(self.shape, dtype=bool)
+        if missing is not None:
+            tested = ~np.asarray(missing, dtype=bool)
+            self._check_shape(tested)
+
+        if values is not None:
+            values = np.asarray(values, dtype=float)
+            self._check_shape(values)
+            valid = tested & ~np.isnan(values)
+            values = np.where(valid, values, 0)
+            self.count += valid
+            self.total += values
+            self.total_sqrd += values * values
+
+        if passed is not None:
+            passed = np.asarray(passed, dtype=bool)
+            self._check_shape(passed)
+            self.tested += tested
+            self.passed += passed & tested
+
+    def merge(self, other):
+        """
+        Add the totals of another StackedMap to this one.
+
+        Parameters
+        ----------
+        other : StackedMap
+            A stack with the same shape.
+
+        Returns
+        -------
+        None
+        """
+        if other.shape != self.shape:
+            raise ValueError("Stacks must be the same shape to be merged.")
+        self.count += other.count
+        self.total += other.total
+        self.total_sqrd += other.total_sqrd
+        self.tested += other.tested
+        self.passed += other.passed
+
+    def result(self):
+        """
+        Return the per-die statistics.
+
+        Returns
+        -------
+        stats : dict of ndarrays
+            ``'count'``, ``'mean'``, ``'std'`` (population standard
+            deviation), ``'tested'`` and ``'yield'`` (the fraction of
+            ``tested`` that passed). Dies without data are NaN.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.total / self.count
+            var = self.total_sqrd / self.count - mean**2
+            yield_ = self.passed / self.tested
+        std = np.sqrt(np.maximum(var, 0))
+        std[np.isnan(var)] = np.nan
+        return {'count': self.count.copy(),
+                'mean': mean,
+                'std': std,
+                'tested': self.tested.copy(),
+                'yield': yield_,
+                }
+
+
+class DieCoordinateSystem(object):
+    """
+    Convert die coordinates between grid, tester, physical and polar.
+
+    The coordinate systems are:
+
+    + grid: ``(row, column)`` array indices, as used by
+      :func:`rcd_to_2d_array`. Row 0 is at the top of the wafer.
+    + tester: ``(x, y)`` die indices, as used in Reedholm die names.
+      ``x`` is the column and ``y`` the row, both relative to
+      ``tester_origin_rc``.
+    + mm: physical ``(x, y)`` position of the die center relative to the
+      wafer center, with ``y`` pointing up (towards row 0).
+    + polar: ``(radius, theta)`` of the mm position, with ``theta`` in
+      degrees counter-clockwise from the ``+x`` axis.
+
+    The grid to mm transform is an affine transform built once from the
+    die size, wafer center, orientation and flips, so every conversion is
+    a handful of array operations no matter how many dies are converted.
+
+    Parameters
+    ----------
+    die_xy : sequence of numerics, length 2
+        The die ``(x, y)`` size in mm.
+    center_rc : sequence of numerics, length 2, optional
+        The grid ``(row, column)`` coordinate of the wafer center.
+    orientation : numeric, optional
+        Rotation of the wafer in degrees, counter-clockwise.
+    flip_x : bool, optional [False]
+        Mirror the mm ``x`` axis (before rotating).
+    flip_y : bool, optional [False]
+        Mirror the mm ``y`` axis (before rotating).
+    tester_origin_rc : sequence of ints, length 2, optional
+        The grid ``(row, column)`` coordinate of tester die ``x0y0``.
+
+    Attributes
+    ----------
+    matrix : ndarray, shape ``(3, 3)``
+        The affine transform from ``(column, row, 1)`` to ``(x, y, 1)`` in
+        mm.
+    inverse : ndarray, shape ``(3, 3)``
+        The affine transform from mm back to grid.
+
+    Examples
+    --------
+    >>> dcs = DieCoordinateSystem((2, 3), center_rc=(10, 20))
+    >>> dcs.grid_to_mm([10, 9], [20, 22])
+    (array([0., 4.]), array([0., 3.]))
+    >>> radius, theta = dcs.grid_to_polar(9, 22)
+    >>> float(radius), round(float(theta), 2)
+    (5.0, 36.87)
+    """
+    def __init__(self, die_xy, center_rc=(0, 0), orientation=0,
+                 flip_x=False, flip_y=False, tester_origin_rc=(0, 0)):
+        self.die_xy = tuple(die_xy)
+        self.center_rc = tuple(center_rc)
+        self.orientation = orientation
+        self.flip_x = flip_x
+        self.flip_y = flip_y
+        self.tester_origin_rc = tuple(tester_origin_rc)
+
+        # (column, row) -> mm: move the origin to the wafer center, scale
+        # by the die size (rows count downwards), mirror, then rotate.
+        shift = np.array([[1, 0, -center_rc[1]],
+                          [0, 1, -center_rc[0]],
+                          [0, 0, 1]], dtype=float)
+        scale = np.diag([die_xy[0] * (-1 if flip_x else 1),
+                         -die_xy[1] * (-1 if flip_y else 1),
+                         1.])
+        angle = math.radians(orientation)
+        rotate = np.array([[math.cos(angle), -math.sin(angle), 0],
+                           [math.sin(angle), math.cos(angle), 0],
+                           [0, 0, 1]])
+        self.matrix = rotate.dot(scale).dot(shift)
+        self.inverse = np.linalg.inv(self.matrix)
+
+    @staticmethod
+    def _apply(matrix, a, b):
+        """ Apply an affine ``matrix`` to the point arrays ``(a, b)``. """
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        return (matrix[0, 0] * a + matrix[0, 1] * b + matrix[0, 2],
+                matrix[1, 0] * a + matrix[1, 1] * b + matrix[1, 2])
+
+    def grid_to_mm(self, rows, cols):
+        """ Return the mm ``(x, y)`` of grid ``(rows, cols)``. """
+        return self._apply(self.matrix, cols, rows)
+
+    def mm_to_grid(self, x, y):
+        """
+        Return the grid ``(rows, cols)`` of mm ``(x, y)``.
+
+        The results are floats; die centers are at whole numbers.
+        """
+        cols, rows = self._apply(self.inverse, x, y)
+        return rows, cols
+
+    def grid_to_tester(self, rows, cols):
+        """ Return the tester ``(x, y)`` of grid ``(rows, cols)``. """
+        return (np.asarray(cols) - self.tester_origin_rc[1],
+                np.asarray(rows) - self.tester_origin_rc[0])
+
+    def tester_to_grid(self, x, y):
+        """ Return the grid ``(rows, cols)`` of tester ``(x, y)``. """
+        return (np.asarray(y) + self.tester_origin_rc[0],
+                np.asarray(x) + self.tester_origin_rc[1])
+
+    def tester_to_mm(self, x, y):
+        """ Return the mm ``(x, y)`` of tester ``(x, y)``. """
+        return self.grid_to_mm(*self.tester_to_grid(x, y))
+
+    def mm_to_tester(self, x, y):
+        """ Return the (float) tester ``(x, y)`` of mm ``(x, y)``. """
+        return self.grid_to_tester(*self.mm_to_grid(x, y))
+
+    @staticmethod
+    def mm_to_polar(x, y):
+        """ Return the ``(radius, theta)`` of mm ``(x, y)``. """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        return np.hypot(x, y), np.degrees(np.arctan2(y, x))
+
+    @staticmethod
+    def polar_to_mm(radius, theta):
+        """ Return the mm ``(x, y)`` of ``(radius, theta)``. """
+        theta = np.radians(theta)
+        return radius * np.cos(theta), radius * np.sin(theta)
+
+    def grid_to_polar(self, rows, cols):
+        """ Return the ``(radius, theta)`` of grid ``(rows, cols)``. """
+        return self.mm_to_polar(*self.grid_to_mm(rows, cols))
+
+    def polar_to_grid(self, radius, theta):
+        """ Return the float grid ``(rows, cols)`` of ``(radius, theta)``. """
+        return self.mm_to_grid(*self.polar_to_mm(radius, theta))
+
+
+class UnitRegistry(object):
+    """
+    Parse measurement strings such as ``"3.3kOhm"`` into SI values.
+
+    Each unit symbol is registered with the SI base unit it's measured in
+    and the scale that converts it to that base unit. All of the symbols,
+    with every order-of-magnitude prefix of :data:`SI_PREFIXES`, are
+    matched by a single compiled regex.
+
+    Parameters
+    ----------
+    units : dict, optional
+        ``{symbol: (base, scale)}`` of the units to register. Defaults to
+        :data:`DEFAULT_UNITS`.
+
+    Attributes
+    ----------
+    bases : list of str
+        The base units, in unit-code order. Code 0 is ``""``, for numbers
+        without a unit.
+    units : dict
+        ``{symbol: (base, scale)}`` of the registered units.
+
+    Methods
+    -------
+    register(self, symbol, base=None, scale=1)
+        Add a unit symbol.
+    code(self, base)
+        Return the unit code of a base unit.
+    parse(self, strings)
+        Convert measurement strings to SI values and unit codes.
+
+    Examples
+    --------
+    >>> registry = UnitRegistry()
+    >>> values, codes = registry.parse(["3.3kOhm", "12.5mA", "-1.2uV",
+    ...                                 "250mohm", "1.5k", "5 furlongs"])
+    >>> values.tolist()
+    [3300.0, 0.0125, -1.2e-06, 0.25, 1500.0, nan]
+    >>> [registry.bases[code] if code >= 0 else None for code in codes]
+    ['Ohm', 'A', 'V', 'Ohm', '', None]
+    """
+    def __init__(self, units=None):
+        if units is None:
+            units = DEFAULT_UNITS
+        self.bases = [""]
+        self.units = {}
+        self._matcher = None
+        for symbol, (base, scale) in units.items():
+            self.register(symbol, base, scale)
+
+    def register(self, symbol, base=None, scale=1):
+        """
+        Add a unit symbol.
+
+        Parameters
+        ----------
+        symbol : str
+            The unit symbol, as it appears after the prefix.
+        base : str, optional
+            The SI base unit that ``symbol`` is measured in. Defaults to
+            ``symbol`` itself.
+        scale : float, optional
+            The number of ``base`` units in one ``symbol``.
+        """
+        if not symbol:
+            raise ValueError("Unit symbols can't be empty.")
+        if base is None:
+            base = symbol
+        if base not in self.bases:
+            self.bases.append(base)
+        self.units[symbol] = (base, float(scale))
+        self._matcher = None
+
+    def code(self, base):
+        """ Return the unit code of the base unit ``base``. """
+        return self.bases.index(base)
+
+    @property
+    def matcher(self):
+        """
+        The compiled regex that matches a measurement string.
+
+        A prefix and unit (or a bare unit) is tried before a prefix
+        alone, so a unit symbol that is also a prefix, such as ``"T"``,
+        is read as the unit.
+        """
+        if self._matcher is None:
+            prefixes = "|".join(map(re.escape, sorted(SI_PREFIXES, key=len,
+                                                      reverse=True)))
+            symbols = "|".join(map(re.escape, sorted(self.units, key=len,
+                                                     reverse=True)))
+            pattern = r"""
+            \s*
+            ([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)    # the number
+            \s*
+            (?:({0})({1})                                # prefix and unit
+            |({0})())                                    # prefix only
+            \s*$
+            """.format(prefixes, symbols)
+            self._matcher = re.compile(pattern, re.VERBOSE)
+        return self._matcher
+
+    def parse(self, strings):
+        """
+        Convert measurement strings to SI values and unit codes.
+
+        Each distinct string is matched only once. Strings that can't be
+        parsed have a value of NaN and a unit code of -1.
+
+        Parameters
+        ----------
+        strings : iterable of str
+            The strings to convert, such as a column of a CSV file.
+
+        Returns
+        -------
+        values : ndarray of floats
+            The value of each string, in its SI base unit.
+        codes : ndarray of ints
+            The unit code of each string. See :attr:`bases`.
+        """
+        tokens, unique = _factorize(list(strings))
+
+        symbols = [""] + list(self.units)
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        unit_scales = np.array([1.0] + [scale for _, scale
+                                        in self.units.values()])
+        unit_codes = np.array([0] + [self.bases.index(base) for base, _
+                                     in self.units.values()])
+        prefixes = list(SI_PREFIXES)
+        prefix_index = {prefix: i for i, prefix in enumerate(prefixes)}
+        prefix_scales = np.array([SI_PREFIXES[prefix] for prefix in prefixes])
+
+        numbers = np.full(len(unique), np.nan)
+        prefix_ids = np.zeros(len(unique), dtype=np.intp)
+        unit_ids = np.zeros(len(unique), dtype=np.intp)
+        matched = np.zeros(len(unique), dtype=bool)
+        match = self.matcher.match
+        for index, item in enumerate(unique):
+            if isinstance(item, bytes):
+                item = item.decode(errors='replace')
+            found = match(item) if isinstance(item, str) else None
+            if found is not None:
+                number, prefix, symbol, bare_prefix, _ = found.groups()
+                if prefix is None:
+                    prefix, symbol = bare_prefix, ""
+                numbers[index] = float(number)
+                prefix_ids[index] = prefix_index[prefix]
+                unit_ids[index] = symbol_index[symbol]
+                matched[index] = True
+
+        values = (numbers * prefix_scales[prefix_ids]
+                  * unit_scales[unit_ids])
+        codes = np.where(matched, unit_codes[unit_ids], -1)
+        return values[tokens], codes[tokens]
+
+
+class HashCache(object):
+    """
+    A persistent cache of file digests, stored in an SQLite database.
+
+    A digest is only returned while the size, modification time, and
+    inode of the file are the same as when it was hashed, so changed
+    files are always rehashed. New digests are written in batches, and
+    the database uses write-ahead logging so that several processes can
+    share one cache.
+
+    Parameters
+    ----------
+    path : str
+        The path of the SQLite database. Created if it doesn't exist.
+    batch_size : int, optional
+        The number of new digests to hold before writing them.
+    timeout : float, optional
+        The number of seconds to wait for another process's write.
+
+    Attributes
+    ----------
+    path : str
+        The path of the SQLite database.
+    batch_size : int
+        The number of new digests to hold before writing them.
+
+    Methods
+    -------
+    get(self, path, algorithm='md5')
+        Return the cached digest of a file, or ``None``.
+    put(self, path, algorithm, digest, signature=None)
+        Store the digest of a file.
+    digest(self, path, algorithm='md5')
+        Return the digest of a file, hashing it only if needed.
+    digests(self, path, algorithms)
+        Return several digests of a file, hashing it only if needed.
+    flush(self)
+        Write the pending digests.
+    close(self)
+        Write the pending digests and close the database.
+
+    Examples
+    --------
+    >>> with HashCache("hashes.sqlite") as cache:       # doctest: +SKIP
+    ...     digest = cache.digest("wafer_07.csv", 'sha256')
+
+    .. seealso::
+
+       :func:`hash_file`, :func:`binary_file_compare`
+    """
+    def __init__(self, path, batch_size=100, timeout=30):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS digests (
+                    path TEXT NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    digest BLOB NOT NULL,
+                    PRIMARY KEY (path, algorithm)
+                )""")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _signature(path):
+        """ Return the ``(size, mtime_ns, inode)`` of the file ``path``. """
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def get(self, path, algorithm='md5'):
+        """
+        Return the cached digest of a file, or ``None``.
+
+        ``None`` is also returned if the file has changed since it was
+        hashed.
+        """
+        key = (os.path.abspath(path), algorithm)
+        signature = self._signature(path)
+        with self._lock:
+            if key in self._pending:
+                row = self._pending[key]
+            else:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, inode, digest FROM digests"
+                    " WHERE path = ? AND algorithm = ?", key).fetchone()
+        if row is None or tuple(row[:3]) != signature:
+            return None
+        return bytes(row[3])
+
+    def put(self, path, algorithm, digest, signature=None):
+        """
+        Store the digest of a file.
+
+        ``signature`` is the ``(size, mtime_ns, inode)`` of the file when
+        it was hashed, and defaults to its current values.
+        """
+        if signature is None:
+            signature = self._signature(path)
+        key = (os.path.abspath(path), algorithm)
+        with self._lock:
+            self._pending[key] = tuple(signature) + (bytes(digest), )
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def digest(self, path, algorithm='md5'):
+        """ Return the digest of a file, hashing it only if needed. """
+        return self.digests(path, [algorithm])[0]
+
+    def digests(self, path, algorithms):
+        """
+        Return several digests of a file, hashing it only if needed.
+
+        The missing digests are computed in a single pass with
+        :func:`hash_file_multi`. They aren't stored if the file changed
+        while it was being hashed.
+        """
+        digests = [self.get(path, algorithm) for algorithm in algorithms]
+        missing = [algorithm for algorithm, digest
+                   in zip(algorithms, digests) if digest is None]
+        if not missing:
+            return digests
+
+        signature = self._signature(path)
+        new = dict(zip(missing, hash_file_multi(path, missing)))
+        if self._signature(path) == signature:
+            for algorithm in missing:
+                self.put(path, algorithm, new[algorithm], signature)
+        return [new[algorithm] if digest is None else digest
+                for algorithm, digest in zip(algorithms, digests)]
+
+    def flush(self):
+        """ Write the pending digests in a single transaction. """
+        with self._lock:
+            rows = [key + value for key, value in self._pending.items()]
+            self._pending = {}
+            if rows:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO digests VALUES"
+                        " (?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        """ Write the pending digests and close the database. """
+        self.flush()
+        self._conn.close()
+
 
 # ---------------------------------------------------------------------------
 ### Functions
@@ -600,33 +1471,230 @@ def max_dist_sqrd(center, size):
 
     Parameters
     ----------
-    center : tuple of length 2, numerics
+    center : tuple of length 2, numerics or ndarrays
         ``(x, y)`` tuple defining the rectangle's center coordinates
 
-    size : tuple of length 2
+    size : tuple of length 2, numerics or ndarrays
         ``(x, y)`` tuple that defines the size of the rectangle.
 
     Returns
     -------
-    dist : float
+    dist : float or ndarray
         The distance from the origin (0, 0) to the farthest corner of the
-        rectangle.
+        rectangle. An array if any of the inputs are arrays, in which case
+        they are broadcast together.
 
 
     .. seealso::
 
        :func:`max_dist`
     """
-    half_x = size[0]/2.
-    half_y = size[1]/2.
-    if center[0] < 0:
-        half_x = -half_x
-    if center[1] < 0:
-        half_y = -half_y
-    dist = (center[0] + half_x)**2 + (center[1] + half_y)**2
+    # Moving away from the origin is the same as adding half the size to
+    # the absolute value of the center, and this works on arrays too.
+    dist = ((abs(center[0]) + size[0]/2.)**2
+            + (abs(center[1]) + size[1]/2.)**2)
     return dist
 
 
+def gross_die_per_wafer(die_xy, dia=150, excl=5, fss=5, offset=(0, 0)):
+    """
+    Calculate the number of whole dies that fit on a wafer.
+
+    A die counts if all four of its corners are inside the edge exclusion
+    ring and its bottom edge is at least ``fss`` above the wafer flat. The
+    flat chord is taken from :data:`FLAT_LENGTHS`. Wafer sizes not listed
+    there are treated as notched and ``fss`` is measured from the bottom
+    of the wafer.
+
+    ``die_xy`` and ``offset`` may be arrays of candidates, in which case
+    every candidate is evaluated at once.
+
+    Parameters
+    ----------
+    die_xy : array-like, shape ``(2, )`` or ``(n, 2)``
+        The die ``(x, y)`` size in mm.
+    dia : numeric, optional
+        The wafer diameter in mm.
+    excl : numeric, optional
+        The edge exclusion ring width in mm.
+    fss : numeric, optional
+        The front-side scribe (flat) exclusion in mm.
+    offset : array-like, shape ``(2, )`` or ``(n, 2)``, optional
+        The ``(x, y)`` position in mm of the center of die ``center_rc``
+        relative to the wafer center. ``(0, 0)`` puts a die in the middle
+        of the wafer; ``(die_x / 2, die_y / 2)`` puts a street
+        intersection there.
+
+    Returns
+    -------
+    count : int or ndarray of ints
+        The number of whole dies.
+    mask : ndarray of bools, shape ``(rows, cols)`` or ``(n, rows, cols)``
+        ``True`` for every die that is counted, indexed by ``(row,
+        column)`` with row 0 at the top (away from the flat). Multiple
+        candidates share the same grid shape.
+    center_rc : ndarray, shape ``(2, )`` or ``(n, 2)``
+        The grid ``(row, column)`` coordinate of the wafer center, as used
+        by :func:`rc_to_radius`.
+
+    Examples
+    --------
+    >>> count, mask, center_rc = gross_die_per_wafer((5, 5), 100, 5, 5)
+    >>> count
+    216
+    >>> gross_die_per_wafer([(5, 5), (10, 10)], 100, 5, 5)[0]
+    array([216,  45])
+
+
+    .. seealso::
+
+       :func:`max_dist_sqrd`, :func:`optimize_die_offset`
+    """
+    die_xy = np.asarray(die_xy, dtype=float)
+    offset = np.asarray(offset, dtype=float)
+    single = die_xy.ndim == 1 and offset.ndim == 1
+    die_xy, offset = np.broadcast_arrays(np.atleast_2d(die_xy),
+                                         np.atleast_2d(offset))
+
+    mask, center_rc = _die_inclusion_mask(die_xy, offset, dia, excl, fss)
+    count = mask.sum(axis=(1, 2))
+    if single:
+        return int(count[0]), mask[0], center_rc[0]
+    return count, mask, center_rc
+
+
+def optimize_die_offset(die_xy, dia=150, excl=5, fss=5, steps=(20, 20),
+                        rotate=False, num=10, chunk_size=256,
+                        max_workers=None):
+    """
+    Find the die grid offsets that give the most whole dies on a wafer.
+
+    Offsets are searched on a ``steps`` grid over one die pitch in ``x``
+    and ``y`` (the pattern repeats after that). Candidates are counted in
+    vectorized chunks of ``chunk_size`` by a pool of processes.
+
+    Parameters
+    ----------
+    die_xy : sequence of numerics, length 2
+        The die ``(x, y)`` size in mm.
+    dia : numeric, optional
+        The wafer diameter in mm.
+    excl : numeric, optional
+        The edge exclusion ring width in mm.
+    fss : numeric, optional
+        The front-side scribe (flat) exclusion in mm.
+    steps : sequence of ints, length 2, optional
+        The number of ``(x, y)`` offsets to try across one die pitch.
+    rotate : bool, optional [False]
+        If ``True``, also try the die rotated by 90 degrees.
+    num : int, optional
+        The number of best candidates to return.
+    chunk_size : int, optional
+        The number of candidates each worker evaluates at once.
+    max_workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+        Use ``1`` to evaluate in the current process.
+
+    Returns
+    -------
+    results : list of dict
+        The best ``num`` candidates, most dies first, with the keys
+        ``'count'``, ``'die_xy'``, ``'offset'``, ``'mask'`` and
+        ``'center_rc'``. See :func:`gross_die_per_wafer` for their meaning.
+
+    Examples
+    --------
+    >>> best = optimize_die_offset((5, 5), 100, 5, 5, max_workers=1)[0]
+    >>> best['count'], best['offset']
+    (222, (1.25, 0.25))
+    """
+    sizes = [tuple(die_xy)]
+    if rotate:
+        sizes.append((die_xy[1], die_xy[0]))
+
+    candidates = []
+    for size in sizes:
+        x_off, y_off = np.meshgrid(np.arange(steps[0]) * size[0] / steps[0],
+                                   np.arange(steps[1]) * size[1] / steps[1])
+        offsets = np.column_stack((x_off.ravel(), y_off.ravel()))
+        candidates.append(np.column_stack(
+            (np.broadcast_to(size, offsets.shape), offsets)))
+    candidates = np.concatenate(candidates)
+
+    chunks = [candidates[i:i + chunk_size]
+              for i in range(0, len(candidates), chunk_size)]
+    args = (dia, excl, fss)
+    if max_workers == 1:
+        counts = [_count_dies_chunk(chunk, *args) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            counts = list(executor.map(_count_dies_chunk, chunks,
+                                       *[[arg] * len(chunks) for arg in args]))
+    counts = np.concatenate(counts)
+
+    results = []
+    for index in np.argsort(-counts, kind='stable')[:num]:
+        size = tuple(candidates[index, :2].tolist())
+        offset = tuple(candidates[index, 2:].tolist())
+        count, mask, center_rc = gross_die_per_wafer(size, dia, excl, fss,
+                                                     offset)
+        results.append({'count': count,
+                        'die_xy': size,
+                        'offset': offset,
+                        'mask': mask,
+                        'center_rc': center_rc,
+                        })
+    return results
+
+
+def _count_dies_chunk(candidates, dia, excl, fss):
+    """
+    Return the die counts for ``(n, 4)`` ``(die_x, die_y, x_off, y_off)``
+    candidates.
+    """
+    mask, _ = _die_inclusion_mask(candidates[:, :2], candidates[:, 2:],
+                                  dia, excl, fss)
+    return mask.sum(axis=(1, 2))
+
+
+def _die_inclusion_mask(die_xy, offset, dia, excl, fss):
+    """
+    Return the inclusion masks and center coordinates for die candidates.
+
+    ``die_xy`` and ``offset`` are ``(n, 2)`` arrays. The masks of all
+    candidates are evaluated on one ``(n, rows, cols)`` grid which is then
+    trimmed to the dies that are included by any candidate.
+    """
+    radius = dia / 2.
+    flat_length = FLAT_LENGTHS.get(dia, 0)
+    flat_y = -math.sqrt(radius**2 - (flat_length / 2.)**2)
+
+    # Enough grid positions on each side of the center for the smallest die.
+    half_c = int(math.ceil(radius / die_xy[:, 0].min())) + 1
+    half_r = int(math.ceil(radius / die_xy[:, 1].min())) + 1
+
+    die_x = die_xy[:, 0, np.newaxis, np.newaxis]
+    die_y = die_xy[:, 1, np.newaxis, np.newaxis]
+    cols = np.arange(-half_c, half_c + 1)[np.newaxis, np.newaxis, :]
+    rows = np.arange(half_r, -half_r - 1, -1)[np.newaxis, :, np.newaxis]
+    x = cols * die_x + offset[:, 0, np.newaxis, np.newaxis]
+    y = rows * die_y + offset[:, 1, np.newaxis, np.newaxis]
+
+    mask = max_dist_sqrd((x, y), (die_x, die_y)) <= (radius - excl)**2
+    mask &= y - die_y / 2. >= flat_y + fss
+
+    center_rc = np.column_stack((half_r + offset[:, 1] / die_xy[:, 1],
+                                 half_c - offset[:, 0] / die_xy[:, 0]))
+
+    any_rows = np.flatnonzero(mask.any(axis=(0, 2)))
+    any_cols = np.flatnonzero(mask.any(axis=(0, 1)))
+    if any_rows.size == 0:
+        return mask[:, :0, :0], center_rc
+    r0, c0 = any_rows[0], any_cols[0]
+    mask = mask[:, r0:any_rows[-1] + 1, c0:any_cols[-1] + 1]
+    return mask, center_rc - (r0, c0)
+
+
 def rc_to_radius(rc_coord, die_xy, center_rc):
     """
     Convert a die RC coordinate to a radius.
@@ -685,6 +1753,123 @@ def rc_to_radius_sqrd(rc_coord, die_xy, center_rc):
     return x_dist + y_dist
 
 
+def radial_profile(rcd, die_xy, center_rc, bin_width=1, weights=None,
+                   skipna=True):
+    """
+    Calculate binned radial statistics of a wafer.
+
+    Like :class:`RadialProfile`, but for a single set of data so that the
+    median of each ring is exact. Medians are taken from one sort of the
+    values by ``(ring, value)``.
+
+    Parameters
+    ----------
+    rcd : list of tuples or ndarray
+        The ``(row, column, value)`` data.
+    die_xy : sequence of numerics, length 2
+        The die ``(x, y)`` size.
+    center_rc : sequence of numerics, length 2
+        The grid ``(row, column)`` coordinate of the wafer center.
+    bin_width : numeric, optional
+        The width of each ring.
+    weights : array-like, optional
+        A weight for each value. The median is then the weighted (lower)
+        median.
+    skipna : bool, optional [True]
+        If ``True``, NaN values are ignored.
+
+    Returns
+    -------
+    stats : dict of ndarrays
+        See :meth:`RadialProfile.result`.
+
+    Examples
+    --------
+    >>> rcd = [(0, 0, 1.0), (0, 1, 4.0), (1, 0, 2.0), (0, 3, 5.0)]
+    >>> radial_profile(rcd, (1, 1), (0, 0), bin_width=2)['median']
+    array([2., 5.])
+
+
+    .. seealso::
+
+       :class:`RadialProfile`, :func:`plotting.radius_plot`
+    """
+    profile = RadialProfile(bin_width, skipna=skipna)
+    profile.add(rcd, die_xy, center_rc, weights)
+    stats = profile.result()
+
+    ring, values, weights = _radial_bins(rcd, die_xy, center_rc, bin_width,
+                                         weights, skipna)
+    if ring.size == 0:
+        return stats
+    order = np.lexsort((values, ring))
+    ring, values, weights = ring[order], values[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, ring[1:] != ring[:-1]])
+    ends = np.r_[starts[1:], len(ring)]
+
+    median = stats['median']
+    if np.all(weights == 1):
+        lengths = ends - starts
+        median[ring[starts]] = (values[starts + (lengths - 1) // 2]
+                                + values[starts + lengths // 2]) / 2.
+    else:
+        cum_weight = np.cumsum(weights)
+        before = np.r_[0, cum_weight][starts]
+        targets = before + (cum_weight[ends - 1] - before) / 2.
+        index = np.searchsorted(cum_weight, targets, side='left')
+        median[ring[starts]] = values[np.minimum(index, ends - 1)]
+    return stats
+
+
+def _rcd_columns(rcd):
+    """ Return the row, column, and data columns of ``rcd`` as arrays. """
+    if isinstance(rcd, np.ndarray) and rcd.dtype.names is not None:
+        names = rcd.dtype.names
+        return rcd[names[0]], rcd[names[1]], rcd[names[2]]
+    rcd = np.asarray(rcd, dtype=float).reshape(-1, 3)
+    return rcd[:, 0], rcd[:, 1], rcd[:, 2]
+
+
+def _radial_bins(rcd, die_xy, center_rc, bin_width, weights, skipna):
+    """ Return the ring index, value and weight of every die in ``rcd``. """
+    rows, cols, values = _rcd_columns(rcd)
+    values = np.asarray(values, dtype=float)
+    if weights is None:
+        weights = np.ones(len(values))
+    else:
+        weights = np.asarray(weights, dtype=float)
+
+    radius = np.sqrt(rc_to_radius_sqrd((rows, cols), die_xy, center_rc))
+    ring = (radius // bin_width).astype(np.intp)
+
+    if skipna:
+        keep = ~np.isnan(values)
+        return ring[keep], values[keep], weights[keep]
+    return ring, values, weights
+
+
+def _histogram_median(histogram, value_range):
+    """
+    Estimate the median of each row of a value histogram.
+
+    The median is linearly interpolated within the bin that contains it.
+    """
+    low, high = value_range
+    width = (high - low) / histogram.shape[1]
+    cum_hist = np.cumsum(histogram, axis=1)
+    half = cum_hist[:, -1] / 2.
+    index = (cum_hist < half[:, np.newaxis]).sum(axis=1)
+    index = np.minimum(index, histogram.shape[1] - 1)
+
+    rows = np.arange(histogram.shape[0])
+    before = cum_hist[rows, index] - histogram[rows, index]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = (half - before) / histogram[rows, index]
+        median = low + (index + fraction) * width
+    median[cum_hist[:, -1] == 0] = np.nan
+    return median
+
+
 def frange(start, stop, step):
     """
     Generator that creates an arbitrary-stepsize range.
@@ -800,34 +1985,13 @@ def from_engineering_notation(string):
 
     .. seealso::
 
-       :func:`to_engineering_notation`
+       :func:`to_engineering_notation`,
+       :func:`from_engineering_notation_array`
     """
-    numbers = {str(i) for i in range(10)}
-    prefixes = {"y": 1e-24,
-                "z": 1e-21,
-                "a": 1e-18,
-                "f": 1e-15,
-                "p": 1e-12,
-                "n": 1e-9,
-                "u": 1e-6,
-                "m": 1e-3,
-                "c": 1e-2,
-                "d": 1e-1,
-                "da": 1e1,
-                "": 1e0,
-                "h": 1e2,
-                "k": 1e3,
-                "M": 1e6,
-                "G": 1e9,
-                "T": 1e12,
-                "P": 1e15,
-                "E": 1e18,
-                "Z": 1e21,
-                "Y": 1e24}
     try:
-        if string[-1] in prefixes and string[-1] not in numbers:
-            return float(string[:-1]) * prefixes[string[-1]]
-        elif string[-1] in numbers:
+        if string[-1] in SI_PREFIXES and string[-1] not in _DIGITS:
+            return float(string[:-1]) * SI_PREFIXES[string[-1]]
+        elif string[-1] in _DIGITS:
             return float(string)
         else:
             raise KeyError
@@ -835,6 +1999,67 @@ def from_engineering_notation(string):
         raise KeyError(str(err) + "Invalid unit prefix in: '%s'." % string)
 
 
+def from_engineering_notation_array(strings):
+    """
+    Convert many number strings with order-of-magnitude suffixes to floats.
+
+    Each distinct string is parsed only once, with a single precompiled
+    regex. Strings that can't be parsed become NaN and are reported
+    instead of raising an error.
+
+    Parameters
+    ----------
+    strings : iterable of str
+        The strings to convert, such as a column of a CSV file. Items that
+        are already numbers are used as-is.
+
+    Returns
+    -------
+    numbers : ndarray of floats
+        The numerical equivalent of each string.
+    errors : list of tuples
+        The ``(index, string)`` of every item that couldn't be parsed.
+
+    Examples
+    --------
+    >>> numbers, errors = from_engineering_notation_array(
+    ...     ["1.23m", "4.5k", "-6.84u", "1.23m", "12", "1.7q"])
+    >>> numbers
+    array([ 1.23e-03,  4.50e+03, -6.84e-06,  1.23e-03,  1.20e+01,       nan])
+    >>> errors
+    [(5, '1.7q')]
+
+    .. seealso::
+
+       :func:`from_engineering_notation`
+    """
+    strings = list(strings)
+    codes, unique = _factorize(strings)
+
+    parsed = np.empty(len(unique))
+    bad = np.zeros(len(unique), dtype=bool)
+    for index, item in enumerate(unique):
+        if isinstance(item, bytes):
+            item = item.decode(errors='replace')
+        if not isinstance(item, str):
+            try:
+                parsed[index] = float(item)
+            except (TypeError, ValueError):
+                parsed[index] = np.nan
+                bad[index] = True
+            continue
+        match = _ENGINEERING_RE.match(item)
+        if match is None:
+            parsed[index] = np.nan
+            bad[index] = True
+        else:
+            parsed[index] = (float(match.group(1))
+                             * SI_PREFIXES[match.group(2)])
+
+    errors = [(int(i), strings[i]) for i in np.flatnonzero(bad[codes])]
+    return parsed[codes], errors
+
+
 @decorators.Deprecated
 def num_to_unit_prefix_str(number, num_dec=5):
     """
@@ -946,42 +2171,125 @@ def to_engineering_notation(number, num_digits=5):
     """
     # FIXME: change num_digits to num_dec and only affect decimal places
     # FIXME: to_engineering_notation(32165, 1) should return '30k'
-    prefixes = {-24: "y",
-                -21: "z",
-                -18: "a",
-                -15: "f",
-                -12: "p",
-                -9: "n",
-                -6: "u",
-                -3: "m",
-                0: "",
-                3: "k",
-                6: "M",
-                9: "G",
-                12: "T",
-                15: "P",
-                18: "E",
-                21: "Z",
-                24: "Y"}
-
+    #        (to_engineering_notation_array already does).
     exp = math.floor(math.log10(abs(number)))
-    if exp in prefixes:
-        prefix = prefixes[exp]
-    elif exp > 24:
-        exp = 24
-    elif exp < -24:
-        exp = -24
-    else:
-        for key in sorted(prefixes.keys())[::-1]:
-            if key < exp:
-                exp = key
-                break
-    prefix = prefixes[exp]
+    exp = min(max(3 * (exp // 3), -24), 24)
+    prefix = _ENGINEERING_PREFIXES[(exp + 24) // 3]
     format_str = "{:.%dg}{:s}" % num_digits
     return_str = format_str.format(number * (10**-exp), prefix)
     return return_str
 
 
+def to_engineering_notation_array(numbers, num_digits=5):
+    """
+    Convert an array of floats to strings with SI order-of-magnitude suffixes.
+
+    Unlike :func:`to_engineering_notation`, every value keeps exactly
+    ``num_digits`` significant digits (trailing zeros are dropped) and is
+    never written in exponent form, so ``32165`` with 1 digit becomes
+    ``'30k'`` rather than ``'3e+01k'``. Values that round up into the next
+    prefix use that prefix, so ``999999`` with 3 digits becomes ``'1M'``.
+
+    .. note::
+
+       + Only uses suffixes that are multiples of 3.
+       + Zero, NaN, and infinite values are written without a suffix.
+
+    Parameters
+    ----------
+    numbers : array-like of numeric
+        The numbers to convert. Can be any shape.
+    num_digits : int, optional
+        The number of significant digits to display, from 1 to 17.
+
+    Returns
+    -------
+    engr_strings : ndarray of str
+        The engineering-formatted string for each value of ``numbers``,
+        with the same shape as ``numbers``.
+
+    Raises
+    ------
+    ValueError
+        If ``num_digits`` is outside of 1 to 17.
+
+    Examples
+    --------
+    >>> to_engineering_notation_array([123456, -0.003216, 0, 6.3e28]).tolist()
+    ['123.46k', '-3.216m', '0', '63000Y']
+    >>> to_engineering_notation_array([32165, 999999, 2.3e-27], 1).tolist()
+    ['30k', '1M', '0.002y']
+
+    .. seealso::
+
+       :func:`to_engineering_notation`,
+       :func:`from_engineering_notation_array`
+    """
+    if not 1 <= num_digits <= 17:
+        raise ValueError("num_digits must be between 1 and 17")
+
+    numbers = np.asarray(numbers, dtype=np.float64)
+    flat = numbers.ravel()
+    normal = np.isfinite(flat) & (flat != 0)
+    values = flat[normal]
+
+    # Split every value into num_digits significant digits and a
+    # power-of-ten exponent. Scaling in two steps keeps subnormal and
+    # huge values in range.
+    with np.errstate(divide='ignore'):
+        exp = np.floor(np.log10(np.abs(values))).astype(np.intp)
+    half = -exp // 2
+    mantissa = (np.abs(values) * np.power(10.0, half)
+                * np.power(10.0, -exp - half))
+    low, high = mantissa < 1, mantissa >= 10
+    mantissa[low] *= 10
+    exp[low] -= 1
+    mantissa[high] /= 10
+    exp[high] += 1
+    digits = np.rint(mantissa * 10.0**(num_digits - 1)).astype(np.int64)
+    carry = digits >= 10**num_digits
+    digits[carry] //= 10
+    exp[carry] += 1
+
+    bucket = np.clip(3 * (exp // 3), -24, 24)
+    int_len = exp - bucket + 1
+    digit_str = digits.astype('<U{}'.format(num_digits))
+    digit_chars = digit_str.view('<U1').reshape(-1, num_digits)
+
+    groups = []
+    for length in np.unique(int_len):
+        which = int_len == length
+        if length >= num_digits:
+            group = np.char.add(digit_str[which], "0" * (length - num_digits))
+        elif length > 0:
+            chars = digit_chars[which]
+            int_part = np.ascontiguousarray(chars[:, :length])
+            frac_part = np.ascontiguousarray(chars[:, length:])
+            group = np.char.add(
+                np.char.add(int_part.view('<U{}'.format(length))[:, 0], "."),
+                frac_part.view('<U{}'.format(num_digits - length))[:, 0])
+            group = np.char.rstrip(np.char.rstrip(group, "0"), ".")
+        else:
+            group = np.char.add("0." + "0" * -length, digit_str[which])
+            group = np.char.rstrip(group, "0")
+        groups.append((which, group))
+
+    width = max([group.itemsize // 4 for _, group in groups] + [1])
+    strings = np.empty(values.shape, dtype='<U{}'.format(width))
+    for which, group in groups:
+        strings[which] = group
+    signs = np.where(values < 0, "-", "")
+    prefixes = np.array(_ENGINEERING_PREFIXES)[(bucket + 24) // 3]
+    strings = np.char.add(np.char.add(signs, strings), prefixes)
+
+    specials = np.where(np.isnan(flat), "nan",
+                        np.where(flat > 0, "inf", "-inf"))
+    result = np.where(flat == 0, "0", specials)
+    result = result.astype(np.result_type(result, strings))
+    result[normal] = strings
+    return result.reshape(numbers.shape)
+
+
 @decorators.Obsolete
 def cei_ink_map(probe_list, bad_xy):
     """
@@ -989,6 +2297,10 @@ def cei_ink_map(probe_list, bad_xy):
 
     Currently only uses a single bin. Plans to add more bins are coming.
     bad_xy is a list of tuples. For now.
+
+    .. warning::
+
+       Obsolete. Use :func:`write_cei_ink_map` instead.
     """
     bad_xy = [(1, 1),
               (5, 4),
@@ -1062,24 +2374,284 @@ def cei_ink_map(probe_list, bad_xy):
     f.close()
 
 
-def rcd_to_2d_array(data, missing=0):
+def write_cei_ink_map(bin_map, file, wafer_id, lot_id, die_xy,
+                      bad_rc=None, bad_bin='B', null_bin='.', bin_names=None,
+                      flat_notch=0, supplier_name="", ref_die=(0, 0),
+                      chunk_rows=256):
     """
-    Convert an array of tuples to a 2D array (matrix-like).
+    Write a CEI pick-and-place ASCII ink map.
 
-    Takes an array of tuples of (Row (y), column (x), data) and converts
-    it to a 2D array where the element index is the row and column value.
+    The header is followed by one line per map row, with one character per
+    die. Rows are written in chunks of ``chunk_rows`` directly from the bin
+    code array.
 
     Parameters
     ----------
-    data : list of tuples
-        The data to convert, in the format ``[(x1, y1, d1),
-        (x2, y2, d2), ...]``
-    missing : any, optional
-        The value to replace use for missing points.
+    bin_map : 2D array-like of single-character strings or ints
+        The bin code of each die, indexed by ``(row, column)``. Positions
+        that are not on the wafer must hold ``null_bin``. Integer codes
+        must be between 0 and 9.
+    file : str or file-like object
+        The path to write to, or an open text stream.
+    wafer_id : str
+        The wafer ID written to the header.
+    lot_id : str
+        The lot ID written to the header.
+    die_xy : sequence of numerics, length 2
+        The die ``(x, y)`` size in mm.
+    bad_rc : iterable of ``(row, column)`` tuples, optional
+        Dies to ink as ``bad_bin`` regardless of their bin code. Positions
+        holding ``null_bin`` are left alone.
+    bad_bin : str, optional
+        The bin code used for ``bad_rc`` dies.
+    null_bin : str, optional
+        The bin code for positions that are not dies.
+    bin_names : dict, optional
+        Maps bin codes to the description written in the header. Bin
+        ``'1'`` defaults to ``"Pass"`` and all others to ``"Fail"``.
+    flat_notch : int, optional
+        The flat/notch orientation in degrees.
+    supplier_name : str, optional
+        The supplier name written to the header.
+    ref_die : sequence of ints, length 2, optional
+        The reference die coordinate.
+    chunk_rows : int, optional
+        The number of map rows to write at a time.
 
     Returns
     -------
-    array : list
+    counts : dict
+        The number of dies in each bin, not including ``null_bin``.
+
+    Examples
+    --------
+    >>> buf = io.StringIO()
+    >>> write_cei_ink_map([['.', '1', '.'], ['1', '1', '2']], buf, "01",
+    ...                   "LOT1", (0.95, 1.36), bad_rc=[(1, 0)])
+    {'1': 2, '2': 1, 'B': 1}
+    >>> print(buf.getvalue())         # doctest: +NORMALIZE_WHITESPACE
+    WAFER_MAP = {
+    WAFER_ID = "01"
+    MAP_TYPE = "Ascii"
+    NULL_BIN = "."
+    ROWS =  2
+    COLUMNS =  3
+    FLAT_NOTCH = 0
+    SUPPLIER_NAME = ""
+    LOT_ID = "LOT1"
+    X_SIZE = 0.950
+    Y_SIZE = 1.360
+    REF_DIES = 1
+    REF_DIE = 0 0
+    BIN  = "1" 2 "Pass" ""
+    BIN  = "2" 1 "Fail" ""
+    BIN  = "B" 1 "Fail" ""
+    MAP = {
+    .1.
+    B12
+    }
+    }
+    """
+    if isinstance(file, str):
+        with open(file, 'w') as openf:
+            return write_cei_ink_map(bin_map, openf, wafer_id, lot_id,
+                                     die_xy, bad_rc, bad_bin, null_bin,
+                                     bin_names, flat_notch, supplier_name,
+                                     ref_die, chunk_rows)
+
+    codes = _bin_code_points(bin_map)
+    null_code = ord(null_bin)
+    if bad_rc is not None:
+        bad_rc = np.asarray(list(bad_rc), dtype=np.intp).reshape(-1, 2)
+        bad = np.zeros(codes.shape, dtype=bool)
+        bad[bad_rc[:, 0], bad_rc[:, 1]] = True
+        codes[bad & (codes != null_code)] = ord(bad_bin)
+
+    values, counts = np.unique(codes, return_counts=True)
+    counts = {chr(k): int(n) for k, n in zip(values, counts)
+              if k != null_code}
+
+    names = {'1': "Pass"}
+    if bin_names is not None:
+        names.update(bin_names)
+
+    header = ['WAFER_MAP = {',
+              'WAFER_ID = "{}"'.format(wafer_id),
+              'MAP_TYPE = "Ascii"',
+              'NULL_BIN = "{}"'.format(null_bin),
+              'ROWS =  {}'.format(codes.shape[0]),
+              'COLUMNS =  {}'.format(codes.shape[1]),
+              'FLAT_NOTCH = {}'.format(flat_notch),
+              'SUPPLIER_NAME = "{}"'.format(supplier_name),
+              'LOT_ID = "{}"'.format(lot_id),
+              'X_SIZE = {:.3f}'.format(die_xy[0]),
+              'Y_SIZE = {:.3f}'.format(die_xy[1]),
+              'REF_DIES = 1',
+              'REF_DIE = {} {}'.format(*ref_die),
+              ]
+    for code, count in counts.items():
+        header.append('BIN  = "{}" {} "{}" ""'.format(
+            code, count, names.get(code, "Fail")))
+    header.append('MAP = {')
+    file.write("\n".join(header) + "\n")
+
+    # Append a newline column and view each chunk of code points as one
+    # long string, so rows are never converted to python lists.
+    lines = np.empty((codes.shape[0], codes.shape[1] + 1), dtype=np.uint32)
+    lines[:, :-1] = codes
+    lines[:, -1] = ord("\n")
+    for start in range(0, lines.shape[0], chunk_rows):
+        chunk = lines[start:start + chunk_rows]
+        file.write(chunk.reshape(-1).view('<U{}'.format(chunk.size))[0])
+
+    file.write("}\n}\n")
+    return counts
+
+
+def write_cei_ink_maps(wafers, max_workers=None, max_pending=None,
+                       **kwargs):
+    """
+    Write CEI ink maps for many wafers using a pool of processes.
+
+    Each map is written to a temporary file which is renamed to its final
+    name once complete, so a partially-written ink map never exists under
+    the final name. At most ``max_pending`` wafers are submitted to the
+    pool at once, so ``wafers`` may be a generator that loads each bin map
+    on demand.
+
+    Parameters
+    ----------
+    wafers : iterable of dict
+        Per-wafer arguments for :func:`write_cei_ink_map`. Each must have
+        ``'bin_map'`` and ``'file'`` (output path) keys and may override any
+        of ``kwargs``. ``'bin_map'`` may also be the path to a ``(row,
+        column, bin)`` wafer map CSV, which is read with
+        :func:`load_wafer_map`.
+    max_workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+    max_pending : int, optional
+        The maximum number of wafers in flight. Defaults to twice
+        ``max_workers``.
+    **kwargs :
+        Arguments to :func:`write_cei_ink_map` shared by all wafers, such as
+        ``lot_id`` and ``die_xy``.
+
+    Returns
+    -------
+    results : list of dict
+        One dict per wafer, in the same order as ``wafers``, with the keys
+        ``'file'`` (the output path), ``'counts'`` (the bin counts) and
+        ``'seconds'`` (the time taken to write the map).
+
+    Examples
+    --------
+    >>> wafers = ({'bin_map': path, 'file': path + ".txt", 'wafer_id': n}
+    ...           for n, path in enumerate(paths, 1))     # doctest: +SKIP
+    >>> write_cei_ink_maps(wafers, lot_id="LOT1",
+    ...                    die_xy=(0.95, 1.36))           # doctest: +SKIP
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * max_workers
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        pending = {}
+        for index, wafer in enumerate(wafers):
+            if len(pending) >= max_pending:
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            job = dict(kwargs)
+            job.update(wafer)
+            pending[executor.submit(_write_cei_ink_map_job, job)] = index
+
+        for future in concurrent.futures.as_completed(pending):
+            results[pending[future]] = future.result()
+
+    return [results[index] for index in sorted(results)]
+
+
+def _write_cei_ink_map_job(job):
+    """ Write a single ink map for :func:`write_cei_ink_maps`. """
+    start = time.perf_counter()
+    path = job.pop('file')
+    bin_map = job.pop('bin_map')
+    if isinstance(bin_map, str):
+        bin_map = _read_bin_map(bin_map, job.get('null_bin', '.'))
+
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        counts = write_cei_ink_map(bin_map, tmp_path, **job)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {'file': path,
+            'counts': counts,
+            'seconds': time.perf_counter() - start,
+            }
+
+
+def _read_bin_map(path, null_bin):
+    """ Read a ``(row, column, bin)`` wafer map CSV into a 2D bin map. """
+    data = load_wafer_map(path, cache=False)
+    bins = data['data']
+    if not np.all(np.isfinite(bins)) or np.any(bins != np.round(bins)):
+        raise ValueError("Bin codes must be integers.")
+    bins = bins.astype(np.int64)
+    if bins.size and (bins.min() < 0 or bins.max() > 9):
+        raise ValueError("Integer bin codes must be between 0 and 9.")
+    shape = (data['row'].max() + 1, data['col'].max() + 1)
+    bin_map = np.full(shape, null_bin, dtype='<U1')
+    bin_map[data['row'], data['col']] = bins.astype('<U1')
+    return bin_map
+
+
+def _bin_code_points(bin_map):
+    """
+    Return a 2D ``uint32`` array of the unicode code points of a bin map.
+
+    Raises ValueError if any bin code is not a single character.
+    """
+    codes = np.asarray(bin_map)
+    if codes.ndim != 2:
+        raise ValueError("bin_map must be 2-dimensional.")
+    if codes.dtype.kind in 'iu':
+        if codes.size and (codes.min() < 0 or codes.max() > 9):
+            raise ValueError("Integer bin codes must be between 0 and 9.")
+        return (codes + ord('0')).astype(np.uint32)
+
+    codes = codes.astype(str)
+    lengths = np.char.str_len(codes)
+    if codes.size and (lengths.min() != 1 or lengths.max() != 1):
+        raise ValueError("Bin codes must be single characters.")
+    return np.ascontiguousarray(codes.astype('<U1')).view(np.uint32).copy()
+
+
+def rcd_to_2d_array(data, missing=0):
+    """
+    Convert an array of tuples to a 2D array (matrix-like).
+
+    Takes an array of tuples of (Row (y), column (x), data) and converts
+    it to a 2D array where the element index is the row and column value.
+
+    Parameters
+    ----------
+    data : list of tuples
+        The data to convert, in the format ``[(x1, y1, d1),
+        (x2, y2, d2), ...]``
+    missing : any, optional
+        The value to replace use for missing points.
+
+    Returns
+    -------
+    array : list
         The matrix-like array.
 
     Example
@@ -1164,24 +2736,515 @@ def xyd_to_2d_array(data, missing=0):
     return data_2d
 
 
-def convert_rcd_xyd(rcd):
+def neighbor_fail_count(fail, missing=None, size=3):
+    """
+    Count the failing neighbors of every die on a wafer map.
+
+    Parameters
+    ----------
+    fail : 2D array-like of bools
+        ``True`` for failing dies, indexed by ``(row, column)``.
+    missing : 2D array-like of bools, optional
+        ``True`` for positions that are not dies. They are never counted as
+        failures, just like the positions off the edge of the array.
+    size : int, optional
+        The width of the (square) neighborhood. Must be odd.
+
+    Returns
+    -------
+    counts : ndarray of ints
+        The number of failing dies in the neighborhood of each position,
+        not counting the position itself.
+
+    Examples
+    --------
+    >>> neighbor_fail_count([[1, 0, 0], [1, 0, 0], [0, 0, 1]])
+    array([[1, 2, 0],
+           [1, 3, 1],
+           [1, 2, 0]])
+    """
+    fail = np.asarray(fail, dtype=bool)
+    if missing is not None:
+        fail = fail & ~np.asarray(missing, dtype=bool)
+    windows = _window_view(fail.astype(np.int16), size, 0)
+    return windows.sum(axis=(2, 3)) - fail
+
+
+def ink_ugly_die(fail, missing=None, min_fails=5, size=3):
+    """
+    Find the good dies that are surrounded by failing dies.
+
+    Parameters
+    ----------
+    fail : 2D array-like of bools
+        ``True`` for failing dies, indexed by ``(row, column)``.
+    missing : 2D array-like of bools, optional
+        ``True`` for positions that are not dies.
+    min_fails : int, optional
+        A good die is inked if at least this many of its neighbors fail.
+    size : int, optional
+        The width of the (square) neighborhood. Must be odd.
+
+    Returns
+    -------
+    ink : ndarray of bools
+        ``True`` for the good dies that should be inked.
+
+    Examples
+    --------
+    >>> ink_ugly_die([[1, 1, 1], [1, 0, 1], [0, 0, 0]], min_fails=5)
+    array([[False, False, False],
+           [False,  True, False],
+           [False, False, False]])
+
+
+    .. seealso::
+
+       :func:`neighbor_fail_count`
+    """
+    fail = np.asarray(fail, dtype=bool)
+    ink = ~fail & (neighbor_fail_count(fail, missing, size) >= min_fails)
+    if missing is not None:
+        ink &= ~np.asarray(missing, dtype=bool)
+    return ink
+
+
+def median_filter(values, missing=None, size=3):
+    """
+    Replace every die with the median of its neighborhood.
+
+    Missing positions and NaN values are left out of each median, so dies
+    near the wafer edge use only the dies that exist.
+
+    Parameters
+    ----------
+    values : 2D array-like of numerics
+        The wafer map, indexed by ``(row, column)``.
+    missing : 2D array-like of bools, optional
+        ``True`` for positions that are not dies.
+    size : int, optional
+        The width of the (square) neighborhood. Must be odd.
+
+    Returns
+    -------
+    filtered : ndarray of floats
+        The filtered map. Missing positions are NaN.
+
+    Examples
+    --------
+    >>> median_filter([[1, 2, 3], [4, 100, 6], [7, 8, 9]])
+    array([[3. , 3.5, 4.5],
+           [5.5, 6. , 7. ],
+           [7.5, 7.5, 8.5]])
+
+
+    .. seealso::
+
+       :func:`mean_filter`
+    """
+    values = _masked_float_map(values, missing)
+    windows = _window_view(values, size, np.nan)
+    windows = windows.reshape(values.shape + (size * size, ))
+    with warnings.catch_warnings():
+        # All-NaN neighborhoods give NaN, which is what we want.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        filtered = np.nanmedian(windows, axis=-1)
+    filtered[np.isnan(values)] = np.nan
+    return filtered
+
+
+def mean_filter(values, missing=None, size=3):
+    """
+    Replace every die with the mean of its neighborhood.
+
+    Missing positions and NaN values are left out of each mean.
+
+    Parameters
+    ----------
+    values : 2D array-like of numerics
+        The wafer map, indexed by ``(row, column)``.
+    missing : 2D array-like of bools, optional
+        ``True`` for positions that are not dies.
+    size : int, optional
+        The width of the (square) neighborhood. Must be odd.
+
+    Returns
+    -------
+    filtered : ndarray of floats
+        The filtered map. Missing positions are NaN.
+
+    Examples
+    --------
+    >>> mean_filter([[1, 2], [3, 4]], missing=[[False, False], [False, True]])
+    array([[ 2.,  2.],
+           [ 2., nan]])
+
+
+    .. seealso::
+
+       :func:`median_filter`
+    """
+    values = _masked_float_map(values, missing)
+    valid = ~np.isnan(values)
+    totals = _window_view(np.where(valid, values, 0), size, 0).sum(axis=(2, 3))
+    counts = _window_view(valid.astype(np.int16), size, 0).sum(axis=(2, 3))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        filtered = totals / counts
+    filtered[~valid] = np.nan
+    return filtered
+
+
+def diff_wafer_maps(before, after, missing=None):
+    """
+    Compare the bins of two wafer maps with the same geometry.
+
+    Parameters
+    ----------
+    before : 2D array-like
+        The bin of each die at the first test stage, indexed by ``(row,
+        column)``. Any type of bin code (ints, characters) can be used.
+    after : 2D array-like
+        The bin of each die at the second test stage.
+    missing : 2D array-like of bools, optional
+        ``True`` for positions that are not dies. They are never counted
+        as changed and are left out of ``transitions``.
+
+    Returns
+    -------
+    changed : ndarray of bools
+        ``True`` for dies whose bin changed.
+    transitions : ndarray of ints, shape ``(len(bins), len(bins))``
+        ``transitions[i, j]`` is the number of dies that went from bin
+        ``bins[i]`` to bin ``bins[j]``. The diagonal holds the dies that
+        didn't change.
+    bins : ndarray
+        The sorted bin codes that appear in either map. They label the rows
+        and columns of ``transitions``.
+    changed_rc : ndarray of ints, shape ``(n, 2)``
+        The ``(row, column)`` of every changed die.
+
+    Examples
+    --------
+    >>> changed, transitions, bins, changed_rc = diff_wafer_maps(
+    ...     [[1, 1], [2, 1]], [[1, 3], [2, 1]])
+    >>> bins
+    array([1, 2, 3])
+    >>> transitions
+    array([[2, 0, 1],
+           [0, 1, 0],
+           [0, 0, 0]])
+    >>> changed_rc
+    array([[0, 1]])
+    """
+    before = np.asarray(before)
+    after = np.asarray(after)
+    if before.shape != after.shape or before.ndim != 2:
+        raise ValueError("Wafer maps must be 2D and the same shape.")
+
+    changed = before != after
+    if missing is not None:
+        keep = ~np.asarray(missing, dtype=bool)
+        changed &= keep
+        before = before[keep]
+        after = after[keep]
+
+    # Number the bins that actually occur, so the size of ``transitions``
+    # doesn't depend on how large the bin codes are.
+    bins, codes = np.unique(np.concatenate((before.ravel(), after.ravel())),
+                            return_inverse=True)
+    num_bins = len(bins)
+    codes = codes.ravel()
+    from_bin, to_bin = codes[:before.size], codes[before.size:]
+
+    transitions = np.bincount(from_bin * num_bins + to_bin,
+                              minlength=num_bins**2)
+    transitions = transitions.reshape(num_bins, num_bins)
+    return changed, transitions, bins, np.argwhere(changed)
+
+
+def label_clusters(mask, connectivity=8):
+    """
+    Label the connected clusters of ``True`` dies on a wafer map.
+
+    Each row is split into runs of consecutive ``True`` dies and runs on
+    neighboring rows that touch are joined with a union-find. All of this
+    is done on arrays of runs, so the cost grows with the number of runs
+    rather than the number of dies.
+
+    Parameters
+    ----------
+    mask : 2D array-like of bools
+        ``True`` for the dies to cluster (failing dies, for example),
+        indexed by ``(row, column)``.
+    connectivity : int, optional
+        ``4`` to join dies that share an edge, or ``8`` to also join dies
+        that share a corner.
+
+    Returns
+    -------
+    labels : ndarray of ints
+        The same shape as ``mask``, with ``0`` for ``False`` dies and the
+        cluster number ``1..n`` for ``True`` dies. Clusters are numbered in
+        the order their first die appears, row by row.
+    sizes : ndarray of ints, shape ``(n, )``
+        The number of dies in each cluster. ``sizes[0]`` is cluster ``1``.
+    bboxes : ndarray of ints, shape ``(n, 4)``
+        The ``(min_row, min_col, max_row, max_col)`` of each cluster,
+        inclusive.
+    centroids : ndarray of floats, shape ``(n, 2)``
+        The mean ``(row, column)`` of each cluster.
+
+    Examples
+    --------
+    >>> mask = [[1, 1, 0, 0],
+    ...         [0, 0, 1, 0],
+    ...         [1, 0, 0, 0]]
+    >>> labels, sizes, bboxes, centroids = label_clusters(mask)
+    >>> labels
+    array([[1, 1, 0, 0],
+           [0, 0, 1, 0],
+           [2, 0, 0, 0]])
+    >>> sizes
+    array([3, 1])
+    >>> label_clusters(mask, connectivity=4)[1]
+    array([2, 1, 1])
+    """
+    if connectivity not in (4, 8):
+        raise ValueError("connectivity must be 4 or 8.")
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim != 2:
+        raise ValueError("mask must be 2-dimensional.")
+    n_rows, n_cols = mask.shape
+    width = n_cols + 2
+
+    # Find the runs. Padding each row with False on both sides makes every
+    # run start and end within its own row of the flattened array.
+    padded = np.zeros((n_rows, width), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    step = np.diff(padded.ravel())
+    starts = np.flatnonzero(step == 1) + 1
+    ends = np.flatnonzero(step == -1) + 1
+    run_row = starts // width
+    run_start = starts % width - 1
+    run_end = ends % width - 1          # exclusive
+    n_runs = len(starts)
+
+    # Pair every run with the runs on the previous row that it touches.
+    # Keys are positions in the flattened padded array, so a search over
+    # all runs can't match runs on any other row.
+    reach = 1 if connectivity == 8 else 0
+    prev_base = (run_row - 1) * width
+    first = np.searchsorted(run_row * width + run_end,
+                            prev_base + run_start - reach, side='right')
+    last = np.searchsorted(run_row * width + run_start,
+                           prev_base + run_end + reach, side='left')
+    num_pairs = np.maximum(last - first, 0)
+    run_a = np.repeat(np.arange(n_runs), num_pairs)
+    offsets = np.arange(num_pairs.sum()) - np.repeat(
+        np.cumsum(num_pairs) - num_pairs, num_pairs)
+    run_b = np.repeat(first, num_pairs) + offsets
+
+    # Union-find: hook the larger root onto the smaller one, then compress
+    # paths, until every pair shares a root.
+    parent = np.arange(n_runs)
+    while True:
+        root_a, root_b = parent[run_a], parent[run_b]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        np.minimum.at(parent,
+                      np.maximum(root_a, root_b)[differ],
+                      np.minimum(root_a, root_b)[differ])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    roots, run_label = np.unique(parent, return_inverse=True)
+    n_clusters = len(roots)
+    run_label = run_label.ravel() + 1
+
+    lengths = run_end - run_start
+    labels = np.zeros(mask.shape, dtype=np.intp)
+    pixel_run = np.repeat(np.arange(n_runs), lengths)
+    pixel_col = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths - run_start, lengths)
+    labels[run_row[pixel_run], pixel_col] = run_label[pixel_run]
+
+    index = run_label - 1
+    sizes = np.bincount(index, lengths, n_clusters).astype(np.intp)
+    bboxes = np.empty((n_clusters, 4), dtype=np.intp)
+    bboxes[:, :2] = max(n_rows, n_cols)
+    bboxes[:, 2:] = -1
+    np.minimum.at(bboxes[:, 0], index, run_row)
+    np.minimum.at(bboxes[:, 1], index, run_start)
+    np.maximum.at(bboxes[:, 2], index, run_row)
+    np.maximum.at(bboxes[:, 3], index, run_end - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroids = np.column_stack((
+            np.bincount(index, run_row * lengths, n_clusters),
+            np.bincount(index, (run_start + run_end - 1) / 2. * lengths,
+                        n_clusters),
+        )) / sizes[:, np.newaxis]
+
+    return labels, sizes, bboxes, centroids
+
+
+def _masked_float_map(values, missing):
+    """ Return ``values`` as a float array with NaN at missing positions. """
+    values = np.array(values, dtype=float)
+    if missing is not None:
+        values[np.asarray(missing, dtype=bool)] = np.nan
+    return values
+
+
+def _window_view(array_2d, size, fill):
+    """
+    Return a read-only ``(rows, cols, size, size)`` view of neighborhoods.
+
+    ``array_2d`` is padded with ``fill`` so that every position has a full
+    neighborhood. Only the padded copy is allocated; the windows are a
+    strided view of it.
+    """
+    if size < 1 or size % 2 == 0:
+        raise ValueError("size must be a positive odd number.")
+    pad = size // 2
+    padded = np.pad(array_2d, pad, mode='constant', constant_values=fill)
+    row_stride, col_stride = padded.strides
+    return np.lib.stride_tricks.as_strided(
+        padded,
+        shape=array_2d.shape + (size, size),
+        strides=(row_stride, col_stride, row_stride, col_stride),
+        writeable=False,
+    )
+
+
+def convert_rcd_xyd(rcd, sort=True):
     """
     Convert a list of ``(a, b, data)`` to ``(b, a, data)``.
 
     Simply swaps the first two items in each sublist. Also sorts the new
     list by ``x`` then ``y``.
 
+    Record arrays (numpy arrays with named fields) are not copied: the
+    first two fields are swapped by reinterpreting the array with a new
+    dtype, so the result is a view on ``rcd``.
+
     Parameters
     ----------
-    rcd : list of tuples
+    rcd : list of tuples or structured ndarray
         The data to convert.
+    sort : bool, optional [True]
+        If ``True``, sort the result by ``x`` then ``y``. Otherwise the
+        result is in the same order as ``rcd``.
+
+    Returns
+    -------
+    list of tuples or structured ndarray
+        A copy of ``rcd`` with sublist index 0 and 1 swapped, sorted. For
+        record arrays, a view (``sort=False``) or a sorted copy of the
+        view (``sort=True``).
+
+    Examples
+    --------
+    >>> rcd = np.array([(1, 2, 0.5), (0, 3, 0.7)],
+    ...                dtype=[('row', int), ('col', int), ('data', float)])
+    >>> xyd = convert_rcd_xyd(rcd, sort=False)
+    >>> xyd.dtype.names
+    ('col', 'row', 'data')
+    >>> np.shares_memory(rcd, xyd)
+    True
+
+
+    .. seealso::
+
+       :func:`xyd_sort_order`
+
+    .. note::
+
+       Timing: O(1) for record arrays with ``sort=False``, otherwise
+       O(n log n)
+    """
+    if isinstance(rcd, np.ndarray) and rcd.dtype.names is not None:
+        xyd = rcd.view(_swap_first_fields(rcd.dtype))
+        if sort:
+            return xyd[xyd_sort_order(rcd)]
+        return xyd
+
+    xyd = [(_i[1], _i[0], _i[2]) for _i in rcd]
+    if sort:
+        return sort_by_column(xyd, 0, 1)
+    return xyd
+
+
+def _swap_first_fields(dtype):
+    """
+    Return a structured dtype with the first two fields swapped.
+
+    The fields keep their byte offsets, so the new dtype can be used to
+    view the original data without copying it.
+    """
+    names = list(dtype.names)
+    if len(names) < 2:
+        raise ValueError("At least two fields are needed to swap.")
+    names[0], names[1] = names[1], names[0]
+    return np.dtype({'names': names,
+                     'formats': [dtype.fields[n][0] for n in names],
+                     'offsets': [dtype.fields[n][1] for n in names],
+                     'itemsize': dtype.itemsize,
+                     })
+
+
+# Cache of ``id(array) -> (weakref(array), permutation)``.
+_XYD_ORDER_CACHE = {}
+
+
+def xyd_sort_order(rcd):
+    """
+    Return the permutation that sorts a record array by ``x`` then ``y``.
+
+    ``x`` is the second field (column) of ``rcd`` and ``y`` the first
+    (row). The permutation is computed with :func:`numpy.lexsort` once per
+    array and cached until the array is garbage collected.
+
+    Parameters
+    ----------
+    rcd : structured ndarray
+        The ``(row, column, data...)`` record array.
 
     Returns
     -------
-    list of tuples
-        A copy of ``rcd`` with sublist index 0 and 1 swapped, sorted.
+    ndarray of ints
+        Indices that sort ``rcd`` into ``(x, y)`` order.
+
+    Examples
+    --------
+    >>> rcd = np.array([(1, 2, 0.5), (0, 3, 0.7), (0, 2, 0.1)],
+    ...                dtype=[('row', int), ('col', int), ('data', float)])
+    >>> xyd_sort_order(rcd)
+    array([2, 0, 1])
+
+
+    .. warning::
+
+       The cached permutation is not updated if the coordinates of
+       ``rcd`` are modified in place.
     """
-    return sort_by_column([(_i[1], _i[0], _i[2]) for _i in rcd], 0, 1)
+    key = id(rcd)
+    try:
+        ref, order = _XYD_ORDER_CACHE[key]
+    except KeyError:
+        pass
+    else:
+        if ref() is rcd:
+            return order
+
+    names = rcd.dtype.names
+    order = np.lexsort((rcd[names[0]], rcd[names[1]]))
+    _XYD_ORDER_CACHE[key] = (weakref.ref(rcd), order)
+    weakref.finalize(rcd, _XYD_ORDER_CACHE.pop, key, None)
+    return order
 
 
 def array_2d_to_str(array_2d, delim=''):
@@ -1190,7 +3253,7 @@ def array_2d_to_str(array_2d, delim=''):
 
     Parameters
     ----------
-    array_2d : list of lists
+    array_2d : list of lists or 2D ndarray
         The array to convert.
     delim : str, optional
         The delimiter. Defaults to the empty string. Use ',' to make a true
@@ -1200,11 +3263,305 @@ def array_2d_to_str(array_2d, delim=''):
     -------
     str
         A csv-compatible string.
+
+
+    .. seealso::
+
+       :func:`write_array_2d`
     """
-    output_str = ""
-    for line in array_2d:
-        output_str += delim.join([str(i) for i in line]) + "\n"
-    return output_str
+    buf = io.StringIO()
+    write_array_2d(array_2d, buf, delim)
+    return buf.getvalue()
+
+
+def write_array_2d(array_2d, file, delim='', fmt=None, chunk_rows=1024):
+    """
+    Write a 2D array to a file as spreadsheet text, one row per line.
+
+    Rows are formatted and written in chunks of ``chunk_rows`` so that the
+    full text of the array is never held in memory. Numeric ndarrays are
+    formatted a chunk at a time by numpy rather than calling ``str()`` on
+    each cell.
+
+    Parameters
+    ----------
+    array_2d : iterable of sequences or 2D ndarray
+        The array to write. Any iterable of rows, such as a generator, is
+        accepted.
+    file : str or file-like object
+        The path to write to, or an open text stream.
+    delim : str, optional
+        The delimiter. Defaults to the empty string. Use ',' to make a true
+        CSV file.
+    fmt : str, optional
+        A ``%``-style format string applied to every cell of a numeric
+        ndarray, such as ``'%.3f'``. Defaults to the same text as ``str()``.
+    chunk_rows : int, optional
+        The number of rows to format before each write.
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> buf = io.StringIO()
+    >>> write_array_2d(np.array([[1.5, 2], [3, 4]]), buf, ',')
+    >>> buf.getvalue()
+    '1.5,2.0\\n3.0,4.0\\n'
+    >>> buf = io.StringIO()
+    >>> write_array_2d(np.array([[1.5, 2], [3, 4]]), buf, ',', fmt='%.2f')
+    >>> buf.getvalue()
+    '1.50,2.00\\n3.00,4.00\\n'
+
+
+    .. seealso::
+
+       :func:`array_2d_to_str`
+    """
+    if isinstance(file, str):
+        with open(file, 'w') as openf:
+            return write_array_2d(array_2d, openf, delim, fmt, chunk_rows)
+
+    numeric = (isinstance(array_2d, np.ndarray)
+               and array_2d.dtype.kind in 'biuf')
+
+    if numeric:
+        for start in range(0, len(array_2d), chunk_rows):
+            chunk = array_2d[start:start + chunk_rows]
+            if fmt is None:
+                cells = chunk.astype(str).tolist()
+            else:
+                cells = np.char.mod(fmt, chunk).tolist()
+            file.write("".join([delim.join(line) + "\n" for line in cells]))
+        return
+
+    rows = iter(array_2d)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            return
+        cells = [[str(i) for i in line] for line in chunk]
+        file.write("".join([delim.join(line) + "\n" for line in cells]))
+
+
+def load_wafer_map(path, dtype=RCD_DTYPE, delimiter=',', skiprows=0,
+                   cache=True):
+    """
+    Load a wafer map CSV into a record array, using a binary cache.
+
+    The first load parses the CSV and saves the result next to it as a
+    ``.npy`` file whose name contains the size and modification time of
+    the CSV and a hash of ``dtype``, ``delimiter``, and ``skiprows``.
+    Later loads of the unchanged CSV with the same options memory-map that
+    file instead of parsing the text again, so the data is shared between
+    processes that read the same map.
+
+    Parameters
+    ----------
+    path : str
+        The path to the CSV file.
+    dtype : numpy.dtype, optional
+        The record layout of each line. Defaults to :data:`RCD_DTYPE`.
+    delimiter : str, optional
+        The column delimiter.
+    skiprows : int, optional
+        The number of header lines to skip.
+    cache : bool, optional [True]
+        If ``False``, always parse the CSV and don't touch the cache.
+
+    Returns
+    -------
+    ndarray
+        The wafer map. A read-only ``numpy.memmap`` when it came from (or
+        was written to) the cache.
+
+    Notes
+    -----
+    Stale cache files for ``path`` are removed when a new one is written.
+    If the cache can't be written (read-only directory, for example) the
+    parsed array is returned as-is.
+    """
+    if not cache:
+        return np.loadtxt(path, dtype=dtype, delimiter=delimiter,
+                          skiprows=skiprows, ndmin=1)
+
+    dtype = np.dtype(dtype)
+    cache_path = _wafer_map_cache_path(path, dtype, delimiter, skiprows)
+    try:
+        data = np.load(cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    else:
+        if data.dtype == dtype and data.ndim == 1:
+            return data
+
+    data = np.loadtxt(path, dtype=dtype, delimiter=delimiter,
+                      skiprows=skiprows, ndmin=1)
+    try:
+        _write_wafer_map_cache(path, cache_path, data)
+    except OSError:
+        return data
+    return np.load(cache_path, mmap_mode='r')
+
+
+def read_probe_csv(file, dtype=None, chunk_rows=65536, delimiter=',',
+                   skiprows=0, names=None):
+    """
+    Read a probe data CSV in chunks of typed columns.
+
+    Only ``chunk_rows`` lines are held in memory at a time, so files of
+    any size can be processed. Floating-point columns are decoded with
+    :func:`from_engineering_notation_array`, so cells such as ``"1.2m"``
+    are read as numbers.
+
+    Parameters
+    ----------
+    file : str or file object
+        The CSV file to read.
+    dtype : dict, list, or numpy.dtype, optional
+        The type of each column: a ``{name: dtype}`` dict, a list with one
+        dtype per column, or one dtype for all columns. Columns without a
+        type are read as ``float64``.
+    chunk_rows : int, optional
+        The maximum number of lines in each chunk.
+    delimiter : str, optional
+        The column delimiter.
+    skiprows : int, optional
+        The number of lines to skip before the header.
+    names : list of str, optional
+        The column names. If given, the file has no header line.
+        Otherwise the first line (after ``skiprows``) is the header.
+
+    Yields
+    ------
+    chunk : structured ndarray
+        The next ``chunk_rows`` (or fewer) lines. Columns are accessed by
+        name (``chunk['vf']``), and rows are tuple-like, so chunks can be
+        passed directly to :func:`rcd_to_2d_array` and
+        :func:`sort_by_column`.
+
+    Raises
+    ------
+    ValueError
+        If a line has the wrong number of columns, or an integer column
+        has a value that isn't an integer.
+
+    Notes
+    -----
+    Blank lines are skipped. Cells of floating-point columns that can't
+    be parsed are read as NaN.
+
+    Examples
+    --------
+    >>> text = io.StringIO("row,col,vf,bin\\n0,0,1.2,1\\n0,1,980m,2\\n")
+    >>> for chunk in read_probe_csv(text, {'row': int, 'col': int,
+    ...                                    'bin': 'U2'}):
+    ...     print(chunk['vf'].tolist(), chunk['bin'].tolist())
+    [1.2, 0.98] ['1', '2']
+
+    .. seealso::
+
+       :func:`load_wafer_map`
+    """
+    if isinstance(file, str):
+        with open(file, 'r', newline='') as openf:
+            for chunk in read_probe_csv(openf, dtype, chunk_rows, delimiter,
+                                        skiprows, names):
+                yield chunk
+        return
+
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be at least 1")
+
+    reader = csv.reader(file, delimiter=delimiter)
+    rows = filter(None, itertools.islice(reader, skiprows, None))
+    if names is None:
+        names = next(rows, None)
+        if names is None:
+            return
+    names = [name.strip() for name in names]
+
+    if isinstance(dtype, dict):
+        dtypes = [dtype.get(name, np.float64) for name in names]
+    elif isinstance(dtype, (list, tuple)):
+        dtypes = list(dtype)
+    else:
+        dtypes = [np.float64 if dtype is None else dtype] * len(names)
+    if len(dtypes) != len(names):
+        err_txt = "Got {} dtypes for {} columns."
+        raise ValueError(err_txt.format(len(dtypes), len(names)))
+    record = np.dtype([(name, dt) for name, dt in zip(names, dtypes)])
+
+    data_rows = 0
+    while True:
+        lines = list(itertools.islice(rows, chunk_rows))
+        if not lines:
+            return
+        if set(map(len, lines)) != {len(names)}:
+            bad = next(i for i, row in enumerate(lines)
+                       if len(row) != len(names))
+            err_txt = "Expected {} columns; got {} in data row {}."
+            raise ValueError(err_txt.format(len(names), len(lines[bad]),
+                                            data_rows + bad + 1))
+        data_rows += len(lines)
+
+        chunk = np.empty(len(lines), dtype=record)
+        for name, column in zip(names, zip(*lines)):
+            kind = chunk.dtype[name].kind
+            if kind in 'fc':
+                chunk[name] = from_engineering_notation_array(column)[0]
+            elif kind in 'iu':
+                chunk[name] = np.fromiter(map(int, column),
+                                          dtype=chunk.dtype[name],
+                                          count=len(column))
+            else:
+                chunk[name] = np.array(column).astype(chunk.dtype[name])
+        yield chunk
+
+
+def _wafer_map_cache_path(path, dtype, delimiter, skiprows):
+    """
+    Return the cache file name for ``path``'s current size and mtime.
+
+    The name also has a hash of the options the CSV is parsed with, so
+    each set of options has its own cache.
+    """
+    stat = os.stat(path)
+    options = repr((np.dtype(dtype).descr, delimiter, skiprows))
+    key = hashlib.md5(options.encode('utf-8')).hexdigest()[:16]
+    return "{}.{}-{}.{}.npy".format(path, stat.st_size, stat.st_mtime_ns,
+                                    key)
+
+
+def _write_wafer_map_cache(path, cache_path, data):
+    """
+    Atomically save ``data`` to ``cache_path`` and remove stale caches.
+
+    The array is written to a temporary file and renamed so that other
+    processes never memory-map a partial file. Caches of ``path`` for any
+    other size or modification time are stale; caches for the same file
+    with other parse options are kept.
+    """
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as openf:
+            np.save(openf, data)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    folder, name = os.path.split(os.path.abspath(path))
+    current = os.path.basename(cache_path).rsplit(".", 2)[0] + "."
+    cache_re = re.compile(re.escape(name) + r"\.\d+-\d+(\.[0-9a-f]+)?\.npy$")
+    for stale in os.listdir(folder):
+        if stale.startswith(current) or not cache_re.match(stale):
+            continue
+        try:
+            os.remove(os.path.join(folder, stale))
+        except OSError:
+            pass
 
 
 def reedholm_die_to_rc(die_name):
@@ -1234,8 +3591,111 @@ def reedholm_die_to_rc(die_name):
     return (y_row, x_col)
 
 
+def reedholm_dies_to_rc(die_names):
+    """
+    Convert many Reedholm die names ("x27y54") to row and column arrays.
+
+    Exports repeat the same few thousand die names for every parameter, so
+    each distinct name is looked up in a cache and only parsed once. All of
+    the distinct names are parsed by a single regex search.
+
+    Parameters
+    ----------
+    die_names : iterable of str
+        The die names to parse.
+
+    Returns
+    -------
+    rows : ndarray of ints
+        The grid row (``y``) of each die.
+    cols : ndarray of ints
+        The grid column (``x``) of each die.
+
+    Raises
+    ------
+    ValueError
+        If any name is not a Reedholm die name.
+
+    Examples
+    --------
+    >>> rows, cols = reedholm_dies_to_rc(["x27y54", "x-1y3", "x27y54", "xy9"])
+    >>> rows
+    array([54,  3, 54,  9])
+    >>> cols
+    array([27, -1, 27,  0])
+
+
+    .. seealso::
+
+       :func:`reedholm_die_to_rc`, :func:`rc_to_reedholm_dies`
+    """
+    if isinstance(die_names, np.ndarray):
+        die_names = die_names.ravel().tolist()
+
+    # Number each distinct name in order of appearance.
+    codes, unique = _factorize(list(die_names))
+    if not unique:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    text = "\n".join(unique)
+    groups = _REEDHOLM_DIE_RE.findall(text)
+    if len(groups) != len(unique) or text.count("\n") != len(unique) - 1:
+        bad = [n for n in unique if not _REEDHOLM_DIE_RE.fullmatch(n)]
+        raise ValueError("Invalid Reedholm die name: '{}'".format(bad[0]))
+
+    xy = np.array(groups, dtype=str).reshape(-1, 2)
+    xy = np.where(xy == '', '0', xy).astype(np.int64)
+    return xy[codes, 1], xy[codes, 0]
+
+
+def _factorize(items):
+    """
+    Number the distinct values of the list ``items`` in order of appearance.
+
+    Returns the code of each item and the list of distinct items.
+    """
+    index = dict.fromkeys(items)
+    for code, item in enumerate(index):
+        index[item] = code
+    codes = np.fromiter(map(index.__getitem__, items), dtype=np.intp,
+                        count=len(items))
+    return codes, list(index)
+
+
+def rc_to_reedholm_dies(rows, cols):
+    """
+    Convert row and column arrays to Reedholm die names ("x27y54").
+
+    Parameters
+    ----------
+    rows : array-like of ints
+        The grid row (``y``) of each die.
+    cols : array-like of ints
+        The grid column (``x``) of each die.
+
+    Returns
+    -------
+    ndarray of str
+        The die names.
+
+    Examples
+    --------
+    >>> rc_to_reedholm_dies([54, 3], [27, -1]).tolist()
+    ['x27y54', 'x-1y3']
+
+
+    .. seealso::
+
+       :func:`reedholm_dies_to_rc`
+    """
+    cols = np.char.add('x', np.asarray(cols, dtype=np.int64).astype(str))
+    rows = np.char.add('y', np.asarray(rows, dtype=np.int64).astype(str))
+    return np.char.add(cols, rows)
+
+
 #@decorators.Timed
-def binary_file_compare(file1, file2):
+def binary_file_compare(file1, file2, mode='hash', chunk_size=2**20,
+                        cache=None):
     """
     Compare two files byte-by-byte.
 
@@ -1245,6 +3705,18 @@ def binary_file_compare(file1, file2):
         The path to the master file
     file2 : str
         The path to the 2nd file.
+    mode : {'hash', 'mmap'}, optional
+        How the final full compare is done. ``'hash'`` reads both files
+        completely and compares their MD5 checksums. ``'mmap'`` memory-maps
+        both files and compares them ``chunk_size`` bytes at a time,
+        stopping at the first chunk that differs, so memory use doesn't
+        grow with the file size.
+    chunk_size : int, optional
+        The number of bytes compared at a time when ``mode='mmap'``.
+    cache : :class:`HashCache`, optional
+        If given, files whose MD5 digests are both cached are compared by
+        digest without being read, and the full compare of ``mode='hash'``
+        uses (and adds to) the cached digests.
 
     Returns
     -------
@@ -1263,7 +3735,19 @@ def binary_file_compare(file1, file2):
     + 4: different data in full search
 
     See :func:`significant_subsample` for more information on failcode ``3``.
+
+    ``mode='mmap'`` needs files that can be memory-mapped, which is
+    usually the case for local files.
     """
+    if mode not in ('hash', 'mmap'):
+        err_txt = "mode must be 'hash' or 'mmap'; got {!r}"
+        raise ValueError(err_txt.format(mode))
+
+    if cache is not None:
+        digest1 = cache.get(file1, 'md5')
+        if digest1 is not None and digest1 == cache.get(file2, 'md5'):
+            return 0
+
     failcode = 0
     with open(file1, 'rb') as ref:
         with open(file2, 'rb') as tmp:
@@ -1289,13 +3773,16 @@ def binary_file_compare(file1, file2):
             # Check a random subset check
             # Limit the subset to a statistically significant size.
             tmp.seek(-1, 2)
-            rand_bytes = significant_subsample(range(int(tmp.tell())))
-            for rand_byte in rand_bytes:
-                ref.seek(rand_byte)
-                tmp.seek(rand_byte)
-                if not ref.read(1) == tmp.read(1):
+            offsets = _significant_offsets(tmp.tell())
+            if mode == 'mmap':
+                data1 = _memmap_bytes(file1)
+                data2 = _memmap_bytes(file2)
+                if not np.array_equal(data1[offsets], data2[offsets]):
                     failcode = 4
                     return failcode
+            elif not _spot_check(ref, tmp, offsets):
+                failcode = 4
+                return failcode
 
             # all else matched, so we try a full compare. Very Slow.
 #            ref.seek(0, 0)
@@ -1306,6 +3793,19 @@ def binary_file_compare(file1, file2):
 #                    failcode = 5
 #                    return failcode
 
+            # Full compare of memory-mapped chunks
+            if mode == 'mmap':
+                if _first_different_chunk(data1, data2,
+                                          chunk_size) is not None:
+                    failcode = 5
+                return failcode
+
+            # Full compare using cached checksums
+            if cache is not None:
+                if cache.digest(file1, 'md5') != cache.digest(file2, 'md5'):
+                    failcode = 5
+                return failcode
+
             # Full compare using checksum
             ref.seek(0, 0)
             tmp.seek(0, 0)
@@ -1329,7 +3829,343 @@ def binary_file_compare(file1, file2):
     return failcode
 
 
-def hash_file(file_object, hasher, blocksize=65536):
+def compare_files(file1, file2, max_ranges=0, chunk_size=2**20):
+    """
+    Find where two files differ.
+
+    Both files are memory-mapped and compared ``chunk_size`` bytes at a
+    time, so memory use doesn't grow with the file size.
+
+    Parameters
+    ----------
+    file1 : str
+        The path to the master file.
+    file2 : str
+        The path to the 2nd file.
+    max_ranges : int, optional
+        The maximum number of differing byte ranges to report. The default
+        of 0 only finds the first differing byte, stopping as soon as it's
+        found.
+    chunk_size : int, optional
+        The number of bytes compared at a time.
+
+    Returns
+    -------
+    first_diff : int or None
+        The offset of the first byte that differs, or ``None`` if the
+        files are identical.
+    ranges : list of tuples
+        Up to ``max_ranges`` ``(start, stop)`` ranges of differing bytes,
+        in order. Adjacent differing bytes are coalesced into one range,
+        and ``stop`` is exclusive. If the files have different sizes, the
+        extra bytes of the longer file are a differing range.
+    truncated : bool
+        ``True`` if there are more than ``max_ranges`` differing ranges.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmpdir:
+    ...     paths = [os.path.join(tmpdir, name) for name in ("a", "b")]
+    ...     for path, data in zip(paths, (b"abcdefgh", b"abXXefgY!")):
+    ...         with open(path, 'wb') as openf:
+    ...             _ = openf.write(data)
+    ...     print(compare_files(*paths))
+    ...     print(compare_files(*paths, max_ranges=5))
+    (2, [], True)
+    (2, [(2, 4), (7, 9)], False)
+
+    .. seealso::
+
+       :func:`binary_file_compare`
+    """
+    data1 = _memmap_bytes(file1)
+    data2 = _memmap_bytes(file2)
+    common = min(len(data1), len(data2))
+    first_diff = None
+    ranges = []
+
+    for start in range(0, common, chunk_size):
+        stop = min(start + chunk_size, common)
+        differs = data1[start:stop] != data2[start:stop]
+        if not differs.any():
+            continue
+        if first_diff is None:
+            first_diff = start + int(np.argmax(differs))
+            if max_ranges == 0:
+                return first_diff, [], True
+
+        # Find where runs of differing bytes start and stop.
+        edges = np.diff(np.concatenate(([0], differs.view(np.int8), [0])))
+        # Only keep enough of them to know if the report is truncated.
+        starts = np.flatnonzero(edges == 1)[:max_ranges + 2] + start
+        stops = np.flatnonzero(edges == -1)[:max_ranges + 2] + start
+        _add_ranges(ranges, starts, stops)
+        if len(ranges) > max_ranges:
+            return first_diff, ranges[:max_ranges], True
+
+    if len(data1) != len(data2):
+        if first_diff is None:
+            first_diff = common
+            if max_ranges == 0:
+                return first_diff, [], True
+        _add_ranges(ranges, [common], [max(len(data1), len(data2))])
+        if len(ranges) > max_ranges:
+            return first_diff, ranges[:max_ranges], True
+
+    return first_diff, ranges, False
+
+
+def _add_ranges(ranges, starts, stops):
+    """
+    Append ``(start, stop)`` ranges to ``ranges``, coalescing adjacent ones.
+    """
+    starts = [int(i) for i in starts]
+    stops = [int(i) for i in stops]
+    if ranges and starts and ranges[-1][1] == starts[0]:
+        ranges[-1] = (ranges[-1][0], stops[0])
+        starts, stops = starts[1:], stops[1:]
+    ranges.extend(zip(starts, stops))
+
+
+def compare_trees(dir1, dir2, shallow=False, max_workers=None,
+                  max_pending=None):
+    """
+    Compare every file in two directory trees.
+
+    Files are paired by their path relative to ``dir1`` and ``dir2``.
+    Pairs with different sizes differ without being read; the rest are
+    compared with :func:`binary_file_compare` in a pool of threads.
+    Results are yielded as they complete, so a long comparison can be
+    reported on while it runs. Symbolic links to folders aren't followed.
+
+    Parameters
+    ----------
+    dir1 : str
+        The master directory.
+    dir2 : str
+        The directory to compare to ``dir1``, such as a copy.
+    shallow : bool, optional [False]
+        If ``True``, files with the same size and modification time are
+        reported as ``'same'`` without being read.
+    max_workers : int, optional
+        The number of threads comparing files.
+    max_pending : int, optional
+        The maximum number of comparisons in flight. Defaults to twice
+        ``max_workers``.
+
+    Yields
+    ------
+    name : str
+        The path of the file or folder, relative to ``dir1`` and ``dir2``.
+    status : str
+        One of:
+
+        + ``'missing'``: only in ``dir1``
+        + ``'extra'``: only in ``dir2``
+        + ``'differ'``: in both, with different contents
+        + ``'same'``: in both, with the same contents
+        + ``'error'``: in both, but couldn't be read (for example, because
+          it was deleted after the trees were scanned), or a folder that
+          couldn't be listed in either tree. Files in such a folder aren't
+          reported as missing or extra.
+
+    Examples
+    --------
+    >>> for name, status in compare_trees(src, dst):    # doctest: +SKIP
+    ...     if status != 'same':
+    ...         print(name, status)
+    wafer_07.csv differ
+    lot_summary.txt missing
+
+    .. seealso::
+
+       :func:`binary_file_compare`
+    """
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    if max_pending is None:
+        max_pending = 2 * max_workers
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        scans = [executor.submit(_scan_tree, root) for root in (dir1, dir2)]
+        (files1, errors1), (files2, errors2) = [scan.result()
+                                                for scan in scans]
+
+        errors = set(errors1) | set(errors2)
+        for name in sorted(errors):
+            yield name, 'error'
+
+        def unlisted(name):
+            """ Return ``True`` if a parent folder couldn't be listed. """
+            folder = os.path.dirname(name)
+            while folder:
+                if folder in errors:
+                    return True
+                folder = os.path.dirname(folder)
+            return False
+
+        for name in sorted(files1.keys() - files2.keys()):
+            if not unlisted(name):
+                yield name, 'missing'
+        for name in sorted(files2.keys() - files1.keys()):
+            if not unlisted(name):
+                yield name, 'extra'
+
+        pending = {}
+        try:
+            for name in sorted(files1.keys() & files2.keys()):
+                stat1, stat2 = files1[name], files2[name]
+                if stat1.st_size != stat2.st_size:
+                    yield name, 'differ'
+                    continue
+                if stat1.st_size == 0 or (
+                        shallow and stat1.st_mtime_ns == stat2.st_mtime_ns):
+                    yield name, 'same'
+                    continue
+                if len(pending) >= max_pending:
+                    done, _ = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        yield pending.pop(future), future.result()
+                future = executor.submit(_compare_tree_files,
+                                         os.path.join(dir1, name),
+                                         os.path.join(dir2, name))
+                pending[future] = name
+            for future in concurrent.futures.as_completed(pending):
+                yield pending[future], future.result()
+        finally:
+            # Don't start the remaining comparisons if the caller stopped
+            # iterating early.
+            for future in pending:
+                future.cancel()
+
+
+def _scan_tree(root):
+    """
+    Find every file under ``root``.
+
+    Symbolic links to folders aren't followed, so a link loop can't make
+    the scan recurse forever.
+
+    Returns
+    -------
+    files : dict
+        ``{relative path: os.stat_result}`` of every file.
+    errors : list of str
+        The relative paths of the subfolders that couldn't be listed.
+    """
+    files = {}
+    errors = []
+    folders = [""]
+    while folders:
+        folder = folders.pop()
+        try:
+            entries = list(os.scandir(os.path.join(root, folder)))
+        except OSError:
+            if not folder:
+                raise
+            errors.append(folder)
+            continue
+        for entry in entries:
+            name = os.path.join(folder, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(name)
+            elif entry.is_file():
+                try:
+                    files[name] = entry.stat()
+                except OSError:
+                    # Deleted since the folder was listed.
+                    continue
+    return files, errors
+
+
+def _compare_tree_files(path1, path2):
+    """
+    Return ``'same'``, ``'differ'`` or ``'error'`` for two files of the
+    same size.
+    """
+    try:
+        result = binary_file_compare(path1, path2, mode='mmap')
+    except OSError:
+        return 'error'
+    return 'same' if result == 0 else 'differ'
+
+
+def _significant_offsets(population):
+    """
+    Return sorted random offsets for a significant sample of a population.
+
+    The sample is the same size as :func:`significant_subsample` would
+    take from ``range(population)``, but it's drawn without iterating
+    over the whole population.
+    """
+    if population <= 0:
+        return np.zeros(0, dtype=np.int64)
+    num = min(significant_sample_size(population), population)
+    return np.sort(np.array(random.sample(range(population), num),
+                            dtype=np.int64))
+
+
+def _spot_check(file1, file2, offsets, block_size=65536):
+    """
+    Return ``True`` if two open binary files match at all ``offsets``.
+
+    ``offsets`` must be sorted. Offsets that are within ``block_size`` of
+    each other are read with a single read of the span between them,
+    using ``os.pread`` where it's available so the file positions aren't
+    moved. Only the bytes at ``offsets`` are compared.
+    """
+    if len(offsets) == 0:
+        return True
+    blocks = offsets // block_size
+    splits = np.flatnonzero(np.diff(blocks)) + 1
+    for group in np.split(offsets, splits):
+        start = int(group[0])
+        size = int(group[-1]) - start + 1
+        index = group - start
+        span1 = np.frombuffer(_read_at(file1, start, size), dtype=np.uint8)
+        span2 = np.frombuffer(_read_at(file2, start, size), dtype=np.uint8)
+        if len(span1) != size or len(span2) != size:
+            return False
+        if not np.array_equal(span1[index], span2[index]):
+            return False
+    return True
+
+
+def _read_at(openf, offset, size):
+    """ Read ``size`` bytes at ``offset`` of the open binary file. """
+    if hasattr(os, 'pread'):
+        return os.pread(openf.fileno(), size, offset)
+    openf.seek(offset)
+    return openf.read(size)
+
+
+def _memmap_bytes(path):
+    """ Return a read-only ``uint8`` memory map of the file ``path``. """
+    if os.path.getsize(path) == 0:
+        # Empty files can't be memory-mapped.
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def _first_different_chunk(data1, data2, chunk_size):
+    """
+    Return the offset of the first chunk where two byte arrays differ.
+
+    ``data1`` and ``data2`` must be the same length. Returns ``None`` if
+    they're equal.
+    """
+    for start in range(0, len(data1), chunk_size):
+        stop = start + chunk_size
+        if not np.array_equal(data1[start:stop], data2[start:stop]):
+            return start
+    return None
+
+
+def hash_file(file_object, hasher, blocksize=65536, cache=None):
     """
     Hash a file using a given hashing type.
 
@@ -1341,6 +4177,12 @@ def hash_file(file_object, hasher, blocksize=65536):
         The hasher to use.
     blocksize : int, optional
         The block size to read from ``file_object``.
+    cache : :class:`HashCache`, optional
+        If given, ``file_object`` is a binary file opened by name and still
+        at its start, and ``hasher`` hasn't been updated yet, the digest is
+        looked up in (and added to) ``cache``. It's then computed from the
+        file on disk, so ``hasher`` isn't updated. Otherwise the stream is
+        hashed as usual and ``cache`` isn't used.
 
     Returns
     -------
@@ -1356,18 +4198,249 @@ def hash_file(file_object, hasher, blocksize=65536):
 
        Examples of valid hashers are ``hashlib.md5()``, ``hashlib.sha256()``,
        etc.
+
+    .. seealso::
+
+       :func:`hash_file_multi` to compute several hashes in one pass.
     """
-    buf = file_object.read(blocksize)
-    while len(buf) > 0:
+    path = getattr(file_object, 'name', None)
+    if (cache is not None and isinstance(path, str)
+            and os.path.isfile(path)
+            and hasattr(file_object, 'readinto')
+            and file_object.seekable() and file_object.tell() == 0
+            and _is_fresh_hasher(hasher)):
+        digest = cache.digest(path, hasher.name)
+        file_object.seek(0, os.SEEK_END)
+        return digest
+    return hash_file_multi(file_object, [hasher], blocksize)[0]
+
+
+def _is_fresh_hasher(hasher):
+    """ Return ``True`` if ``hasher`` hasn't been updated with any data. """
+    try:
+        return hasher.digest() == hashlib.new(hasher.name).digest()
+    except (TypeError, ValueError):
+        return False
+
+
+def hash_file_multi(file, hashers, blocksize=2**20):
+    """
+    Hash a file with several hashers in a single pass.
+
+    Binary files are read into one preallocated buffer, and a
+    ``memoryview`` of each block is passed to every hasher, so no memory
+    is allocated per block. Streams are hashed from their current position
+    to the end.
+
+    Parameters
+    ----------
+    file : str or io.IOBase object
+        The path of the file or the stream to hash. Text streams are
+        hashed as UTF-8.
+    hashers : sequence of hashlib.HASH objects or str
+        The hashers to update, or the names of hashlib algorithms.
+    blocksize : int, optional
+        The number of bytes read at a time.
+
+    Returns
+    -------
+    digests : list of bytes
+        The digest of each hasher, in the same order as ``hashers``.
+
+    Examples
+    --------
+    >>> md5, sha256 = hash_file_multi(io.BytesIO(b"abc"), ['md5', 'sha256'])
+    >>> md5.hex()
+    '900150983cd24fb0d6963f7d28e17f72'
+    >>> sha256.hex()[:16]
+    'ba7816bf8f01cfea'
+
+    .. seealso::
+
+       :func:`hash_file`
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as openf:
+            return hash_file_multi(openf, hashers, blocksize)
+
+    hashers = [hashlib.new(hasher) if isinstance(hasher, str) else hasher
+               for hasher in hashers]
+
+    if not hasattr(file, 'readinto'):
+        # Text streams
+        buf = file.read(blocksize)
+        while len(buf) > 0:
+            if isinstance(buf, str):
+                buf = buf.encode('utf-8')
+            for hasher in hashers:
+                hasher.update(buf)
+            buf = file.read(blocksize)
+    else:
+        buf = bytearray(blocksize)
+        view = memoryview(buf)
+        size = file.readinto(buf)
+        while size:
+            block = view[:size]
+            for hasher in hashers:
+                hasher.update(block)
+            size = file.readinto(buf)
+    return [hasher.digest() for hasher in hashers]
+
+
+def find_duplicates(paths, partial_size=4096, algorithm='sha256',
+                    min_size=1, max_workers=None, cache=None):
+    """
+    Find files with identical contents.
+
+    Files are grouped by size, then by a hash of their first and last
+    ``partial_size`` bytes, and only files that still match are fully
+    hashed, so most files are never read completely. Hashing is done in
+    a pool of threads. Each size is grouped as soon as all of its files
+    have been partially hashed, and each group of duplicates is yielded
+    as soon as it's known. Files that can't be read (for example, because
+    they were deleted after being found) are skipped.
+
+    A file reached by more than one path (through a hard link, a symbolic
+    link, or overlapping ``paths``) is only searched once, under the first
+    path it's found by, so it's never reported as a duplicate of itself.
+    Symbolic links to folders inside a searched directory aren't followed.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The files and directories to search. Directories are searched
+        recursively.
+    partial_size : int, optional
+        The number of bytes from each end of a file in the partial hash.
+    algorithm : str, optional
+        The name of the hashlib algorithm to use.
+    min_size : int, optional
+        Smaller files are ignored. The default ignores empty files.
+    max_workers : int, optional
+        The number of threads hashing files.
+    cache : :class:`HashCache`, optional
+        If given, full digests are looked up in (and added to) ``cache``.
+
+    Yields
+    ------
+    group : list of str
+        The sorted paths of two or more files with identical contents.
+
+    Examples
+    --------
+    >>> for group in find_duplicates(["/data/probe"]):   # doctest: +SKIP
+    ...     print(group)
+    ['/data/probe/lot1/w07.csv', '/data/probe/old/w07.csv']
+
+    .. seealso::
+
+       :func:`hash_file_multi`, :class:`HashCache`
+    """
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    # Group by size
+    by_size = {}
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files = ((os.path.join(path, name), stat)
+                     for name, stat in _scan_tree(path)[0].items())
+        else:
+            try:
+                files = [(path, os.stat(path))]
+            except OSError:
+                continue
+        for name, stat in files:
+            if stat.st_size < min_size:
+                continue
+            if not stat.st_ino:
+                # os.scandir doesn't fill in st_ino on Windows.
+                try:
+                    stat = os.stat(name)
+                except OSError:
+                    continue
+            key = (stat.st_dev, stat.st_ino)
+            if key not in seen:
+                seen.add(key)
+                by_size.setdefault(stat.st_size, []).append(name)
+    candidates = [(size, names) for size, names in sorted(by_size.items())
+                  if len(names) > 1]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        # ``pending`` maps each future to its group and file name. A group
+        # is a size (hashing both ends of the file) or a ``(size, partial
+        # digest)`` pair (hashing the whole file). ``groups`` holds the
+        # number of files left to hash in each group and the names found
+        # for each digest so far.
+        pending = {}
+        groups = {}
+
+        def submit(group, names, func, *args):
+            groups[group] = [len(names), {}]
+            for name in names:
+                pending[executor.submit(func, name, *args)] = (group, name)
+
+        for size, names in candidates:
+            submit(size, names, _partial_digest, size, partial_size,
+                   algorithm)
+
         try:
-            buf = buf.encode('utf-8')
-        except UnicodeError:
-            pass
-        hasher.update(buf)
-        buf = file_object.read(blocksize)
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    group, name = pending.pop(future)
+                    left, by_digest = groups[group]
+                    try:
+                        digest = future.result()
+                    except OSError:
+                        # Unreadable files can't be reported as duplicates.
+                        pass
+                    else:
+                        by_digest.setdefault(digest, []).append(name)
+                    groups[group][0] = left - 1
+                    if left > 1:
+                        continue
+
+                    del groups[group]
+                    for digest, names in by_digest.items():
+                        if len(names) < 2:
+                            continue
+                        # Small files were already fully hashed.
+                        if (isinstance(group, tuple)
+                                or group <= 2 * partial_size):
+                            yield sorted(names)
+                        else:
+                            submit((group, digest), names, _full_digest,
+                                   algorithm, cache)
+        finally:
+            # Don't start the remaining hashes if the caller stopped
+            # iterating early.
+            for future in pending:
+                future.cancel()
+
+
+def _partial_digest(path, size, partial_size, algorithm):
+    """ Hash the first and last ``partial_size`` bytes of a file. """
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as openf:
+        hasher.update(openf.read(partial_size))
+        if size > partial_size:
+            openf.seek(max(partial_size, size - partial_size))
+            hasher.update(openf.read(partial_size))
     return hasher.digest()
 
 
+def _full_digest(path, algorithm, cache):
+    """ Hash a whole file, using ``cache`` if it's given. """
+    if cache is not None:
+        return cache.digest(path, algorithm)
+    return hash_file_multi(path, [algorithm])[0]
+
+
 def significant_subsample(array, CI=0.95, E=0.02, p=0.5):
     """
     Return a subarray that is a statictically significant sampling.
@@ -19,7 +19,12 @@ import random
 import hashlib
 import io
 import math
+import shutil
+import tempfile
+import threading
+import warnings
 from types import GeneratorType
+from unittest.mock import patch
 
 # Third-Party
 from hypothesis import given
@@ -68,6 +73,161 @@ class TestEngineeringNotationKnownValues(unittest.TestCase):
         self.assertEqual(core.to_engineering_notation(2.3e-27), "0.0023y")
 
 
+class TestFromEngineeringNotationArray(unittest.TestCase):
+    """ Bulk parsing of engineering-notation strings """
+
+    def test_matches_scalar_function(self):
+        strings = [string for string, _
+                   in TestEngineeringNotationKnownValues.known_values]
+        result, errors = core.from_engineering_notation_array(strings)
+        self.assertEqual(errors, [])
+        self.assertEqual(result.dtype, np.float64)
+        for string, number in zip(strings, result):
+            with self.subTest(string=string):
+                self.assertEqual(number,
+                                 core.from_engineering_notation(string))
+
+    def test_known_values(self):
+        known_values = (("12.5", 12.5),
+                        (" 3.3 k ", 3.3e3),
+                        ("+.5M", 0.5e6),
+                        ("1e3m", 1.0),
+                        ("2da", 20.0),
+                        (b"4.7n", 4.7e-9),
+                        (7, 7.0),
+                        )
+        strings = [string for string, _ in known_values]
+        result, errors = core.from_engineering_notation_array(strings)
+        self.assertEqual(errors, [])
+        for (string, number), value in zip(known_values, result):
+            with self.subTest(string=string):
+                self.assertAlmostEqual(value, number)
+
+    def test_bad_entries_are_nan_and_reported(self):
+        strings = ["1k", "1.7q", "", "1k", "nan", None, "1.7q"]
+        result, errors = core.from_engineering_notation_array(strings)
+        expected = [1e3, np.nan, np.nan, 1e3, np.nan, np.nan, np.nan]
+        np.testing.assert_array_equal(result, expected)
+        self.assertEqual(errors, [(1, "1.7q"), (2, ""), (4, "nan"),
+                                  (5, None), (6, "1.7q")])
+
+    def test_empty(self):
+        result, errors = core.from_engineering_notation_array([])
+        self.assertEqual(result.shape, (0, ))
+        self.assertEqual(errors, [])
+
+
+class TestToEngineeringNotationArray(unittest.TestCase):
+    """ Vectorized formatting to engineering-notation strings """
+
+    def test_matches_scalar_function(self):
+        values = [number for _, number
+                  in TestEngineeringNotationKnownValues.known_values]
+        values += [123456, -0.003216, 6.3e28, 2.3e-27]
+        result = core.to_engineering_notation_array(values)
+        for number, string in zip(values, result):
+            with self.subTest(number=number):
+                self.assertEqual(string,
+                                 core.to_engineering_notation(number))
+
+    def test_known_values(self):
+        # (number, num_digits, expected)
+        known_values = ((32165, 1, "30k"),
+                        (32165, 2, "32k"),
+                        (32165, 4, "32.17k"),
+                        (1000036, 6, "1.00004M"),
+                        (999999, 3, "1M"),
+                        (-999.96e-12, 4, "-1n"),
+                        (0.1, 5, "100m"),
+                        (1e-24, 5, "1y"),
+                        (0, 5, "0"),
+                        (np.nan, 5, "nan"),
+                        (-np.inf, 5, "-inf"),
+                        )
+        for number, num_digits, expected in known_values:
+            with self.subTest(number=number, num_digits=num_digits):
+                result = core.to_engineering_notation_array([number],
+                                                            num_digits)
+                self.assertEqual(result[0], expected)
+
+    def test_shape_is_kept(self):
+        values = np.arange(1, 7, dtype=float).reshape(2, 3) * 1e3
+        result = core.to_engineering_notation_array(values)
+        self.assertEqual(result.shape, (2, 3))
+        self.assertEqual(result[1, 2], "6k")
+
+    def test_round_trip(self):
+        rng = np.random.RandomState(0)
+        values = rng.randn(1000) * 10.0 ** rng.randint(-20, 20, 1000)
+        strings = core.to_engineering_notation_array(values, 6)
+        result, errors = core.from_engineering_notation_array(strings)
+        self.assertEqual(errors, [])
+        np.testing.assert_allclose(result, values, rtol=1e-5)
+
+    def test_invalid_num_digits_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            core.to_engineering_notation_array([1], 0)
+
+
+class TestUnitRegistry(unittest.TestCase):
+    """ Parsing of measurement strings with unit prefixes and symbols """
+    # (string, SI value, base unit)
+    known_values = (("3.3kOhm", 3.3e3, "Ohm"),
+                    ("12.5mA", 12.5e-3, "A"),
+                    ("-1.2uV", -1.2e-6, "V"),
+                    ("10 k\u03a9", 10e3, "Ohm"),
+                    ("5Hz", 5, "Hz"),
+                    ("1ms", 1e-3, "s"),
+                    ("2daA", 20, "A"),
+                    ("4F", 4, "F"),
+                    ("4f", 4e-15, ""),
+                    ("1.5k", 1.5e3, ""),
+                    ("27", 27, ""),
+                    )
+
+    def setUp(self):
+        self.registry = core.UnitRegistry()
+
+    def test_known_values(self):
+        strings = [string for string, _, _ in self.known_values]
+        values, codes = self.registry.parse(strings)
+        for (string, value, base), result, code in zip(self.known_values,
+                                                        values, codes):
+            with self.subTest(string=string):
+                self.assertAlmostEqual(result, value)
+                self.assertEqual(self.registry.bases[code], base)
+
+    def test_bad_entries(self):
+        values, codes = self.registry.parse(["1Pa", "", None, "1V"])
+        np.testing.assert_array_equal(values, [np.nan, np.nan, np.nan, 1])
+        np.testing.assert_array_equal(codes,
+                                      [-1, -1, -1, self.registry.code("V")])
+
+    def test_register(self):
+        self.registry.register("mil", "m", 25.4e-6)
+        values, codes = self.registry.parse(["2mil", "1kmil"])
+        np.testing.assert_allclose(values, [50.8e-6, 25.4e-3])
+        self.assertEqual(codes.tolist(), [self.registry.code("m")] * 2)
+
+        # Symbols that are also prefixes are read as units.
+        self.registry.register("T")
+        self.registry.register("m")
+        values, codes = self.registry.parse(["1T", "2m", "3mm", "4kT",
+                                             "5k"])
+        np.testing.assert_allclose(values, [1, 2, 3e-3, 4e3, 5e3])
+        self.assertEqual([self.registry.bases[code] for code in codes],
+                         ["T", "m", "m", "T", ""])
+
+    def test_register_empty_symbol_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            self.registry.register("")
+
+    def test_empty(self):
+        values, codes = self.registry.parse([])
+        self.assertEqual(values.shape, (0, ))
+        self.assertEqual(codes.shape, (0, ))
+
+
 class TestRoundToMultiple(unittest.TestCase):
     """ Known Value testing for round_to_multiple. """
     # (value, round_to, result)
@@ -256,6 +416,92 @@ class TestMaxDist(unittest.TestCase):
                 self.assertEqual(expected, result)
 
 
+class TestGrossDiePerWafer(unittest.TestCase):
+
+    @staticmethod
+    def _brute_force(die_xy, dia, excl, fss, offset):
+        """ Count dies one at a time with max_dist_sqrd. """
+        radius = dia / 2
+        flat_length = core.FLAT_LENGTHS.get(dia, 0)
+        flat_y = -math.sqrt(radius**2 - (flat_length / 2)**2)
+        count = 0
+        for i in range(-100, 101):
+            for j in range(-100, 101):
+                x = j * die_xy[0] + offset[0]
+                y = i * die_xy[1] + offset[1]
+                dist = core.max_dist_sqrd((x, y), die_xy)
+                if (dist <= (radius - excl)**2
+                        and y - die_xy[1] / 2 >= flat_y + fss):
+                    count += 1
+        return count
+
+    known_values = (
+        ((5, 5), 100, 5, 5, (0, 0)),
+        ((3.3, 2.1), 150, 3, 4, (1.0, -0.7)),
+        ((4, 6), 200, 3, 3, (2, 3)),
+    )
+
+    def test_known_values(self):
+        for die_xy, dia, excl, fss, offset in self.known_values:
+            with self.subTest(die_xy=die_xy, dia=dia, offset=offset):
+                count, mask, _ = core.gross_die_per_wafer(die_xy, dia, excl,
+                                                          fss, offset)
+                expected = self._brute_force(die_xy, dia, excl, fss, offset)
+                self.assertEqual(expected, count)
+                self.assertEqual(expected, mask.sum())
+
+    def test_center_rc(self):
+        die_xy = (3.3, 2.1)
+        _, mask, center_rc = core.gross_die_per_wafer(die_xy, 150, 3, 4,
+                                                      (1.0, -0.7))
+        for row, col in zip(*np.nonzero(mask)):
+            radius = core.rc_to_radius((row, col), die_xy, center_rc)
+            self.assertLess(radius, 72)
+
+    def test_flat_is_at_bottom(self):
+        _, mask, center_rc = core.gross_die_per_wafer((5, 5), 150, 0, 20)
+        rows = np.flatnonzero(mask.any(axis=1))
+        self.assertGreater(center_rc[0] - rows[0], rows[-1] - center_rc[0])
+
+    def test_candidate_arrays(self):
+        sizes = [(5, 5), (3.3, 2.1), (10, 4)]
+        counts, masks, center_rc = core.gross_die_per_wafer(sizes, 150, 3, 4)
+        self.assertEqual(counts.shape, (3, ))
+        self.assertEqual(masks.shape[0], 3)
+        self.assertEqual(center_rc.shape, (3, 2))
+        for size, count in zip(sizes, counts):
+            self.assertEqual(count, core.gross_die_per_wafer(size, 150,
+                                                             3, 4)[0])
+
+
+class TestOptimizeDieOffset(unittest.TestCase):
+
+    def test_results_are_ranked(self):
+        results = core.optimize_die_offset((5, 5), 100, 5, 5, steps=(4, 4),
+                                           num=16, chunk_size=5,
+                                           max_workers=2)
+        self.assertEqual(len(results), 16)
+        counts = [r['count'] for r in results]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        for result in results:
+            self.assertEqual(result['count'], result['mask'].sum())
+            count, _, _ = core.gross_die_per_wafer(result['die_xy'], 100,
+                                                   5, 5, result['offset'])
+            self.assertEqual(result['count'], count)
+
+    def test_best_is_at_least_centered(self):
+        centered, _, _ = core.gross_die_per_wafer((3.3, 2.1), 150, 3, 4)
+        best = core.optimize_die_offset((3.3, 2.1), 150, 3, 4, num=1,
+                                        max_workers=1)[0]
+        self.assertGreaterEqual(best['count'], centered)
+
+    def test_rotate(self):
+        results = core.optimize_die_offset((10, 4), 100, 5, 5, steps=(3, 3),
+                                           rotate=True, num=18,
+                                           max_workers=1)
+        self.assertEqual({r['die_xy'] for r in results}, {(10, 4), (4, 10)})
+
+
 class TestRCDto2DArray(unittest.TestCase):
 
     known_values = (
@@ -292,6 +538,321 @@ class TestXYDto2DArray(unittest.TestCase):
                 self.assertEqual(expected, result)
 
 
+class TestRadialProfile(unittest.TestCase):
+
+    die_xy = (2.43, 3.3)
+    center_rc = (24, 31.5)
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        rows, cols = np.mgrid[0:48, 0:63]
+        self.rcd = np.column_stack((rows.ravel(), cols.ravel(),
+                                    rng.normal(10, 5, rows.size)))
+        self.rcd[::17, 2] = np.nan
+        radius = np.sqrt(core.rc_to_radius_sqrd((self.rcd[:, 0],
+                                                 self.rcd[:, 1]),
+                                                self.die_xy, self.center_rc))
+        self.ring = (radius // 5).astype(int)
+
+    def _expected(self, func):
+        values = self.rcd[:, 2]
+        valid = ~np.isnan(values)
+        return np.array([func(values[(self.ring == i) & valid])
+                         for i in range(self.ring[valid].max() + 1)])
+
+    def test_known_values(self):
+        stats = core.radial_profile(self.rcd, self.die_xy, self.center_rc, 5)
+        np.testing.assert_allclose(stats['mean'], self._expected(np.mean))
+        np.testing.assert_allclose(stats['std'], self._expected(np.std))
+        np.testing.assert_allclose(stats['median'],
+                                   self._expected(np.median))
+        np.testing.assert_array_equal(stats['count'], self._expected(len))
+        np.testing.assert_allclose(stats['radius'][:2], [2.5, 7.5])
+
+    def test_weighted(self):
+        rcd = [(0, 0, 1.0), (0, 1, 2.0), (1, 0, 10.0)]
+        stats = core.radial_profile(rcd, (1, 1), (0, 0), bin_width=2,
+                                    weights=[3, 1, 1])
+        self.assertAlmostEqual(stats['mean'][0], 15 / 5.)
+        self.assertEqual(stats['median'][0], 1.0)
+
+    def test_nan_propagates_without_skipna(self):
+        stats = core.radial_profile([(0, 0, 1.0), (0, 0, np.nan)], (1, 1),
+                                    (0, 0), skipna=False)
+        self.assertTrue(np.isnan(stats['mean'][0]))
+        self.assertEqual(stats['count'][0], 2)
+
+    def test_nan_median_without_skipna(self):
+        profile = core.RadialProfile(2, value_range=(0, 10), skipna=False)
+        profile.add([(0, 0, 5.0), (0, 1, np.nan), (1, 0, np.nan),
+                     (1, 1, np.nan), (0, 4, 3.0)], (1, 1), (0, 0))
+        stats = profile.result()
+        self.assertTrue(np.isnan(stats['mean'][0]))
+        self.assertTrue(np.isnan(stats['median'][0]))
+        self.assertAlmostEqual(stats['median'][-1], 3.0, places=1)
+        self.assertEqual(profile.histogram[0].sum(), 1)
+
+    def test_merge_matches_single_profile(self):
+        halves = (self.rcd[::2], self.rcd[1::2])
+        whole = core.RadialProfile(5, value_range=(-10, 30))
+        whole.add(self.rcd, self.die_xy, self.center_rc)
+        first = core.RadialProfile(5, value_range=(-10, 30))
+        second = core.RadialProfile(5, value_range=(-10, 30))
+        first.add(halves[1][:100], self.die_xy, self.center_rc)
+        second.add(halves[0], self.die_xy, self.center_rc)
+        second.add(halves[1][100:], self.die_xy, self.center_rc)
+        first.merge(second)
+        for key, value in whole.result().items():
+            np.testing.assert_allclose(value, first.result()[key])
+
+    def test_histogram_median(self):
+        profile = core.RadialProfile(5, value_range=(-10, 30),
+                                     value_bins=400)
+        profile.add(self.rcd, self.die_xy, self.center_rc)
+        np.testing.assert_allclose(profile.result()['median'],
+                                   self._expected(np.median), atol=0.2)
+
+    def test_merge_different_bins_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            core.RadialProfile(1).merge(core.RadialProfile(2))
+        with self.assertRaises(ValueError):
+            core.RadialProfile(1, value_range=(0, 10)).merge(
+                core.RadialProfile(1, value_range=(0, 20)))
+
+    def test_merge_value_range_types(self):
+        profile = core.RadialProfile(1, value_range=(0, 10))
+        for value_range in ([0, 10], np.array([0., 10.])):
+            with self.subTest(value_range=value_range):
+                profile.merge(core.RadialProfile(1, value_range=value_range))
+
+
+class TestNeighborhoodFilters(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.values = rng.normal(size=(9, 11))
+        self.missing = np.zeros(self.values.shape, dtype=bool)
+        self.missing[0, :3] = True
+        self.missing[-2:, -1] = True
+        self.fail = rng.rand(*self.values.shape) < 0.4
+
+    def _brute_force(self, values, func, size):
+        """ Apply ``func`` to the valid neighbors of every die. """
+        half = size // 2
+        result = np.full(values.shape, np.nan)
+        for r in range(values.shape[0]):
+            for c in range(values.shape[1]):
+                if self.missing[r, c]:
+                    continue
+                window = values[max(r - half, 0):r + half + 1,
+                                max(c - half, 0):c + half + 1]
+                valid = ~self.missing[max(r - half, 0):r + half + 1,
+                                      max(c - half, 0):c + half + 1]
+                result[r, c] = func(window[valid])
+        return result
+
+    def test_median_filter(self):
+        for size in (3, 5):
+            with self.subTest(size=size):
+                result = core.median_filter(self.values, self.missing, size)
+                expected = self._brute_force(self.values, np.median, size)
+                np.testing.assert_allclose(result, expected)
+
+    def test_mean_filter(self):
+        for size in (3, 5):
+            with self.subTest(size=size):
+                result = core.mean_filter(self.values, self.missing, size)
+                expected = self._brute_force(self.values, np.mean, size)
+                np.testing.assert_allclose(result, expected)
+
+    def test_neighbor_fail_count(self):
+        for size in (3, 5):
+            with self.subTest(size=size):
+                result = core.neighbor_fail_count(self.fail, self.missing,
+                                                  size)
+                expected = self._brute_force(self.fail, np.sum, size)
+                expected -= self.fail
+                valid = ~self.missing
+                np.testing.assert_array_equal(result[valid], expected[valid])
+
+    def test_ink_ugly_die(self):
+        ink = core.ink_ugly_die(self.fail, self.missing, min_fails=4)
+        counts = core.neighbor_fail_count(self.fail, self.missing)
+        expected = ~self.fail & ~self.missing & (counts >= 4)
+        np.testing.assert_array_equal(ink, expected)
+
+    def test_even_size_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            core.mean_filter(self.values, size=4)
+
+
+class TestLabelClusters(unittest.TestCase):
+
+    @staticmethod
+    def _flood_fill(mask, connectivity):
+        """ Label clusters one die at a time. """
+        steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        if connectivity == 8:
+            steps += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+        labels = np.zeros(mask.shape, dtype=int)
+        count = 0
+        for start in zip(*np.nonzero(mask)):
+            if labels[start]:
+                continue
+            count += 1
+            labels[start] = count
+            todo = [start]
+            while todo:
+                row, col = todo.pop()
+                for d_row, d_col in steps:
+                    pos = (row + d_row, col + d_col)
+                    if (0 <= pos[0] < mask.shape[0]
+                            and 0 <= pos[1] < mask.shape[1]
+                            and mask[pos] and not labels[pos]):
+                        labels[pos] = count
+                        todo.append(pos)
+        return labels
+
+    def test_matches_flood_fill(self):
+        rng = np.random.RandomState(3)
+        for _ in range(20):
+            mask = rng.rand(rng.randint(1, 25), rng.randint(1, 25)) < 0.45
+            for connectivity in (4, 8):
+                labels, sizes, bboxes, centroids = core.label_clusters(
+                    mask, connectivity)
+                expected = self._flood_fill(mask, connectivity)
+                np.testing.assert_array_equal(labels, expected)
+                self.assertEqual(len(sizes), expected.max())
+                for n in range(1, expected.max() + 1):
+                    rows, cols = np.nonzero(expected == n)
+                    self.assertEqual(sizes[n - 1], len(rows))
+                    self.assertEqual(tuple(bboxes[n - 1]),
+                                     (rows.min(), cols.min(),
+                                      rows.max(), cols.max()))
+                    np.testing.assert_allclose(centroids[n - 1],
+                                               (rows.mean(), cols.mean()))
+
+    def test_snake_is_one_cluster(self):
+        mask = np.zeros((41, 41), dtype=bool)
+        mask[::2, :] = True
+        mask[1::4, -1] = True
+        mask[3::4, 0] = True
+        labels, sizes, _, _ = core.label_clusters(mask, connectivity=4)
+        self.assertEqual(sizes.tolist(), [mask.sum()])
+
+    def test_empty(self):
+        labels, sizes, bboxes, centroids = core.label_clusters(
+            np.zeros((3, 4), dtype=bool))
+        self.assertFalse(labels.any())
+        self.assertEqual(sizes.shape, (0, ))
+        self.assertEqual(bboxes.shape, (0, 4))
+        self.assertEqual(centroids.shape, (0, 2))
+
+    def test_invalid_connectivity_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            core.label_clusters([[1]], connectivity=6)
+
+
+class TestDiffWaferMaps(unittest.TestCase):
+
+    def test_int_bins(self):
+        rng = np.random.RandomState(4)
+        before = rng.randint(0, 5, size=(20, 30))
+        after = np.where(rng.rand(20, 30) < 0.1,
+                         rng.randint(0, 5, size=(20, 30)), before)
+        changed, transitions, bins, changed_rc = core.diff_wafer_maps(
+            before, after)
+        np.testing.assert_array_equal(changed, before != after)
+        np.testing.assert_array_equal(bins, np.arange(5))
+        for i in range(5):
+            for j in range(5):
+                expected = np.sum((before == i) & (after == j))
+                self.assertEqual(transitions[i, j], expected)
+        np.testing.assert_array_equal(changed_rc,
+                                      np.argwhere(before != after))
+
+    def test_char_bins_and_missing(self):
+        before = [['.', '1', 'B'], ['1', '1', '.']]
+        after = [['.', '2', 'B'], ['1', 'B', 'x']]
+        missing = [[True, False, False], [False, False, True]]
+        changed, transitions, bins, changed_rc = core.diff_wafer_maps(
+            before, after, missing)
+        self.assertEqual(bins.tolist(), ['1', '2', 'B'])
+        self.assertEqual(transitions.tolist(), [[1, 1, 1],
+                                                [0, 0, 0],
+                                                [0, 0, 1]])
+        self.assertEqual(changed_rc.tolist(), [[0, 1], [1, 1]])
+
+    def test_large_int_bins(self):
+        before = [[1, 9999], [1, 1]]
+        after = [[9999, 9999], [1, 5000]]
+        changed, transitions, bins, changed_rc = core.diff_wafer_maps(
+            before, after)
+        self.assertEqual(bins.tolist(), [1, 5000, 9999])
+        self.assertEqual(transitions.tolist(), [[1, 1, 1],
+                                                [0, 0, 0],
+                                                [0, 0, 1]])
+        self.assertEqual(changed_rc.tolist(), [[0, 0], [1, 1]])
+
+    def test_shape_mismatch_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            core.diff_wafer_maps([[1, 2]], [[1], [2]])
+
+
+class TestStackedMap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        self.values = rng.normal(5, 2, size=(10, 6, 7))
+        self.values[rng.rand(*self.values.shape) < 0.1] = np.nan
+        self.passed = rng.rand(*self.values.shape) < 0.8
+
+    def test_known_values(self):
+        stack = core.StackedMap((6, 7))
+        for values, passed in zip(self.values, self.passed):
+            stack.add(values, passed)
+        stats = stack.result()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            np.testing.assert_allclose(stats['mean'],
+                                       np.nanmean(self.values, axis=0))
+            np.testing.assert_allclose(stats['std'],
+                                       np.nanstd(self.values, axis=0))
+        np.testing.assert_array_equal(stats['count'],
+                                      (~np.isnan(self.values)).sum(axis=0))
+        np.testing.assert_allclose(stats['yield'], self.passed.mean(axis=0))
+
+    def test_merge(self):
+        whole = core.StackedMap((6, 7))
+        first = core.StackedMap((6, 7))
+        second = core.StackedMap((6, 7))
+        for n, (values, passed) in enumerate(zip(self.values, self.passed)):
+            whole.add(values, passed)
+            (first if n % 2 else second).add(values, passed)
+        first.merge(second)
+        for key, value in whole.result().items():
+            np.testing.assert_allclose(value, first.result()[key])
+
+    def test_missing(self):
+        stack = core.StackedMap((1, 2))
+        stack.add([[1, 2]], [[True, True]], missing=[[False, True]])
+        stack.add(passed=[[False, False]])
+        stats = stack.result()
+        self.assertEqual(stats['count'].tolist(), [[1, 0]])
+        self.assertEqual(stats['tested'].tolist(), [[2, 1]])
+        self.assertEqual(stats['yield'].tolist(), [[0.5, 0]])
+        self.assertTrue(np.isnan(stats['mean'][0, 1]))
+
+    def test_wrong_shape_raises_value_error(self):
+        stack = core.StackedMap((2, 2))
+        with self.assertRaises(ValueError):
+            stack.add(np.zeros((2, 3)))
+        with self.assertRaises(ValueError):
+            stack.merge(core.StackedMap((3, 2)))
+        with self.assertRaises(ValueError):
+            stack.add()
+
+
 class TestFrange(unittest.TestCase):
 
     known_values = (
@@ -325,6 +886,272 @@ class TestArray2dToStr(unittest.TestCase):
                 self.assertEqual(expected, result)
 
 
+class TestWriteArray2d(unittest.TestCase):
+
+    def test_matches_array_2d_to_str(self):
+        array = np.arange(12).reshape(4, 3)
+        buf = io.StringIO()
+        core.write_array_2d(array, buf, ',', chunk_rows=3)
+        expected = "".join(",".join(str(i) for i in row) + "\n"
+                           for row in array)
+        self.assertEqual(expected, buf.getvalue())
+        self.assertEqual(expected, core.array_2d_to_str(array, ','))
+
+    def test_float_values_match_str(self):
+        array = np.array([[0.1, 1e-20], [2.5, -3]])
+        self.assertEqual("0.1 1e-20\n2.5 -3.0\n",
+                         core.array_2d_to_str(array, ' '))
+
+    def test_fmt(self):
+        buf = io.StringIO()
+        core.write_array_2d(np.array([[1, 2]]), buf, ',', fmt='%03d')
+        self.assertEqual("001,002\n", buf.getvalue())
+
+    def test_write_to_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "map.txt")
+            core.write_array_2d([['a', 'b'], ['c', 'd']], path)
+            with open(path) as openf:
+                self.assertEqual("ab\ncd\n", openf.read())
+
+    def test_generator(self):
+        rows = ([i, i + 1] for i in (1, 3))
+        self.assertEqual("1,2\n3,4\n", core.array_2d_to_str(rows, ','))
+        buf = io.StringIO()
+        core.write_array_2d(([i] for i in range(5)), buf, chunk_rows=2)
+        self.assertEqual("0\n1\n2\n3\n4\n", buf.getvalue())
+
+
+class TestReadProbeCsv(unittest.TestCase):
+
+    text = ("lot,wafer\n"
+            "row,col,vf,ir,bin\n"
+            "0,0,1.2,10n,1\n"
+            "0,1,980m,1.5u,2\n"
+            "\n"
+            "1,0,1.1,bad,1\n"
+            "1,1,1.05,2p,1\n"
+            "1,2,1.3,3n,3\n"
+            )
+    dtype = {'row': np.int32, 'col': np.int32, 'bin': 'U2'}
+
+    def _read(self, **kwargs):
+        kwargs.setdefault('dtype', self.dtype)
+        kwargs.setdefault('skiprows', 1)
+        return list(core.read_probe_csv(io.StringIO(self.text), **kwargs))
+
+    def _assert_same_data(self, chunks, expected_chunks):
+        data = np.concatenate(chunks)
+        expected = np.concatenate(expected_chunks)
+        self.assertEqual(data.dtype, expected.dtype)
+        for name in data.dtype.names:
+            np.testing.assert_array_equal(data[name], expected[name])
+
+    def test_values(self):
+        data = np.concatenate(self._read())
+        self.assertEqual(data.dtype.names, ('row', 'col', 'vf', 'ir', 'bin'))
+        self.assertEqual(data['row'].dtype, np.int32)
+        np.testing.assert_array_equal(data['col'], [0, 1, 0, 1, 2])
+        np.testing.assert_allclose(data['vf'], [1.2, 0.98, 1.1, 1.05, 1.3])
+        np.testing.assert_allclose(data['ir'],
+                                   [10e-9, 1.5e-6, np.nan, 2e-12, 3e-9])
+        self.assertEqual(data['bin'].tolist(), ['1', '2', '1', '1', '3'])
+
+    def test_chunk_sizes(self):
+        chunks = self._read(chunk_rows=2)
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self._assert_same_data(chunks, self._read())
+
+    def test_dtype_list_and_names(self):
+        text = "4,27,27.29\n4,28,3.3k\n"
+        chunks = core.read_probe_csv(io.StringIO(text),
+                                     [np.int32, np.int32, np.float64],
+                                     names=['row', 'col', 'data'])
+        data = np.concatenate(list(chunks))
+        self.assertEqual(data.tolist(), [(4, 27, 27.29), (4, 28, 3300.0)])
+
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "probe.csv")
+            with open(path, 'w') as openf:
+                openf.write(self.text)
+            chunks = list(core.read_probe_csv(path, self.dtype, skiprows=1))
+        self._assert_same_data(chunks, self._read())
+
+    def test_plugs_into_rcd_workflow(self):
+        rcd = np.concatenate(self._read(dtype=[int, int, float, float, int]))
+        rcd = rcd[['row', 'col', 'bin']]
+        rcd = core.sort_by_column(rcd, 0, 1)
+        result = core.rcd_to_2d_array(rcd)
+        self.assertEqual(result, [[1, 2, 0], [1, 1, 3]])
+
+    def test_wrong_column_count_raises_valueerror(self):
+        text = "a,b\n1,2\n3\n"
+        with self.assertRaisesRegex(ValueError, "data row 2"):
+            list(core.read_probe_csv(io.StringIO(text)))
+
+    def test_empty_file(self):
+        self.assertEqual(list(core.read_probe_csv(io.StringIO(""))), [])
+
+
+class TestLoadWaferMap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "wafer_map.csv")
+        shutil.copy(os.path.join(REF_DATA_PATH, "wafer_map.csv"), self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _cache_files(self):
+        return [f for f in os.listdir(self.tmpdir.name) if f.endswith(".npy")]
+
+    def test_values(self):
+        data = core.load_wafer_map(self.path)
+        self.assertEqual(data.dtype, core.RCD_DTYPE)
+        self.assertEqual(data[0].tolist(), (4, 27, 27.29468813))
+        self.assertEqual(len(data), 1803)
+
+    def test_reload_uses_cache(self):
+        first = core.load_wafer_map(self.path)
+        self.assertEqual(len(self._cache_files()), 1)
+        second = core.load_wafer_map(self.path)
+        self.assertIsInstance(second, np.memmap)
+        np.testing.assert_array_equal(first, second)
+
+    def test_modified_source_invalidates_cache(self):
+        core.load_wafer_map(self.path)
+        old_cache = self._cache_files()
+        with open(self.path, 'a') as openf:
+            openf.write("99,99,1.0\n")
+        data = core.load_wafer_map(self.path)
+        self.assertEqual(data[-1].tolist(), (99, 99, 1.0))
+        self.assertEqual(len(self._cache_files()), 1)
+        self.assertNotEqual(old_cache, self._cache_files())
+
+    def test_no_cache(self):
+        data = core.load_wafer_map(self.path, cache=False)
+        self.assertEqual(len(data), 1803)
+        self.assertEqual(self._cache_files(), [])
+
+    def test_parse_options_have_separate_caches(self):
+        dtype = np.dtype([('r', 'i8'), ('c', 'i8'), ('d', 'f4')])
+        default = core.load_wafer_map(self.path)
+        other = core.load_wafer_map(self.path, dtype=dtype, skiprows=1)
+        self.assertEqual(other.dtype, dtype)
+        self.assertEqual(len(other), 1802)
+        self.assertEqual(len(self._cache_files()), 2)
+
+        default = core.load_wafer_map(self.path)
+        self.assertIsInstance(default, np.memmap)
+        self.assertEqual(default.dtype, core.RCD_DTYPE)
+        self.assertEqual(len(default), 1803)
+
+    def test_cache_with_wrong_dtype_is_ignored(self):
+        core.load_wafer_map(self.path)
+        cache_file = os.path.join(self.tmpdir.name, self._cache_files()[0])
+        np.save(cache_file, np.zeros(3))
+        data = core.load_wafer_map(self.path)
+        self.assertEqual(data.dtype, core.RCD_DTYPE)
+        self.assertEqual(len(data), 1803)
+
+
+class TestWriteCeiInkMap(unittest.TestCase):
+
+    bin_map = [['.', '1', '1', '.'],
+               ['1', '1', '2', '1'],
+               ['.', '3', '1', '.']]
+
+    def _write(self, bin_map, **kwargs):
+        buf = io.StringIO()
+        counts = core.write_cei_ink_map(bin_map, buf, "01", "LOT1",
+                                        (1.5, 2), chunk_rows=2, **kwargs)
+        return counts, buf.getvalue().splitlines()
+
+    def test_map_and_counts(self):
+        counts, lines = self._write(self.bin_map, bad_rc={(0, 0), (1, 3)})
+        self.assertEqual(counts, {'1': 5, '2': 1, '3': 1, 'B': 1})
+        start = lines.index("MAP = {") + 1
+        self.assertEqual(lines[start:], ['.11.', '112B', '.31.', '}', '}'])
+        self.assertIn('BIN  = "B" 1 "Fail" ""', lines)
+        self.assertIn('ROWS =  3', lines)
+        self.assertIn('COLUMNS =  4', lines)
+        self.assertIn('X_SIZE = 1.500', lines)
+
+    def test_integer_codes(self):
+        counts, lines = self._write(np.array([[0, 1], [1, 1]]),
+                                    null_bin='0',
+                                    bin_names={'1': "Good"})
+        self.assertEqual(counts, {'1': 3})
+        self.assertIn('BIN  = "1" 3 "Good" ""', lines)
+        self.assertEqual(lines[-4:-2], ['01', '11'])
+
+    def test_invalid_codes_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            self._write([['1', '12']])
+        with self.assertRaises(ValueError):
+            self._write(np.array([[1, 10]]))
+
+    def test_write_to_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "ink.txt")
+            core.write_cei_ink_map(self.bin_map, path, "01", "LOT1", (1, 1))
+            with open(path) as openf:
+                self.assertEqual(openf.readline(), "WAFER_MAP = {\n")
+
+
+class TestWriteCeiInkMaps(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lot(self):
+        csv_path = os.path.join(self.tmpdir.name, "w3.csv")
+        with open(csv_path, 'w') as openf:
+            openf.write("0,1,1\n1,0,2\n1,1,1\n")
+        wafers = [{'bin_map': [['1', '2'], ['1', '.']], 'wafer_id': "01"},
+                  {'bin_map': [['.', '1'], ['3', '3']], 'wafer_id': "02"},
+                  {'bin_map': csv_path, 'wafer_id': "03"},
+                  ]
+        for n, wafer in enumerate(wafers):
+            wafer['file'] = os.path.join(self.tmpdir.name,
+                                         "ink{}.txt".format(n))
+
+        results = core.write_cei_ink_maps(wafers, max_workers=2,
+                                          max_pending=1, lot_id="LOT1",
+                                          die_xy=(1, 1))
+
+        self.assertEqual([r['file'] for r in results],
+                         [w['file'] for w in wafers])
+        self.assertEqual([r['counts'] for r in results],
+                         [{'1': 2, '2': 1},
+                          {'1': 1, '3': 2},
+                          {'1': 2, '2': 1}])
+        for result in results:
+            self.assertGreaterEqual(result['seconds'], 0)
+        with open(wafers[2]['file']) as openf:
+            lines = openf.read().splitlines()
+        self.assertIn('WAFER_ID = "03"', lines)
+        self.assertEqual(lines[-4:-2], ['.1', '21'])
+        self.assertFalse([f for f in os.listdir(self.tmpdir.name)
+                          if f.endswith((".tmp", ".npy"))])
+
+    def test_non_integral_bins(self):
+        for n, bin_code in enumerate(["1.5", "nan"]):
+            csv_path = os.path.join(self.tmpdir.name, "w{}.csv".format(n))
+            with open(csv_path, 'w') as openf:
+                openf.write("0,0,1\n0,1,{}\n".format(bin_code))
+            wafers = [{'bin_map': csv_path,
+                       'file': os.path.join(self.tmpdir.name, "ink.txt")}]
+            with self.subTest(bin_code=bin_code):
+                with self.assertRaises(ValueError):
+                    core.write_cei_ink_maps(wafers, max_workers=1)
+
+
 class TestThreshold1DArray(unittest.TestCase):
     """ Unit Testing of the threshold_1d_array function """
     list1 = range(8)
@@ -421,6 +1248,161 @@ class TestHashFile(unittest.TestCase):
         f = io.StringIO("Some test data")
         self.assertIsInstance(core.hash_file(f, h), bytes)
 
+    def test_binary_stream(self):
+        data = b"Some test data" * 10000
+        result = core.hash_file(io.BytesIO(data), hashlib.sha256(), 1000)
+        self.assertEqual(result, hashlib.sha256(data).digest())
+
+    def test_text_stream_is_hashed_as_utf8(self):
+        text = "Some test data \u00b5"
+        result = core.hash_file(io.StringIO(text), hashlib.md5(), 4)
+        self.assertEqual(result, hashlib.md5(text.encode('utf-8')).digest())
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "hashes.sqlite")
+        self.path = os.path.join(self.tmpdir.name, "data.csv")
+        self.data = b"1,2,3\n" * 1000
+        with open(self.path, 'wb') as openf:
+            openf.write(self.data)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _modify(self, path, data):
+        stat = os.stat(path)
+        with open(path, 'wb') as openf:
+            openf.write(data)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_digest(self):
+        with core.HashCache(self.db_path) as cache:
+            self.assertIsNone(cache.get(self.path, 'md5'))
+            result = cache.digests(self.path, ['md5', 'sha256'])
+            self.assertEqual(result, [hashlib.md5(self.data).digest(),
+                                      hashlib.sha256(self.data).digest()])
+            self.assertEqual(cache.get(self.path, 'sha256'), result[1])
+
+    def test_persists_between_instances(self):
+        with core.HashCache(self.db_path, batch_size=1000) as cache:
+            expected = cache.digest(self.path)
+        with core.HashCache(self.db_path) as cache:
+            self.assertEqual(cache.get(self.path), expected)
+
+    def test_batched_writes(self):
+        cache = core.HashCache(self.db_path, batch_size=2)
+        other = core.HashCache(self.db_path)
+        cache.put(self.path, 'md5', b"first")
+        self.assertIsNone(other.get(self.path, 'md5'))
+        cache.put(self.path, 'sha1', b"second")
+        self.assertEqual(other.get(self.path, 'md5'), b"first")
+        cache.close()
+        other.close()
+
+    def test_changed_file_is_rehashed(self):
+        with core.HashCache(self.db_path) as cache:
+            cache.digest(self.path)
+            self._modify(self.path, b"new data")
+            self.assertIsNone(cache.get(self.path))
+            self.assertEqual(cache.digest(self.path),
+                             hashlib.md5(b"new data").digest())
+
+    def test_hash_file_uses_cache(self):
+        with core.HashCache(self.db_path) as cache:
+            with open(self.path, 'rb') as openf:
+                result = core.hash_file(openf, hashlib.md5(), cache=cache)
+            self.assertEqual(result, hashlib.md5(self.data).digest())
+            self.assertEqual(cache.get(self.path, 'md5'), result)
+
+            cache.put(self.path, 'md5', b"cached")
+            with open(self.path, 'rb') as openf:
+                result = core.hash_file(openf, hashlib.md5(), cache=cache)
+            self.assertEqual(result, b"cached")
+
+    def test_hash_file_skips_cache_for_partial_hashes(self):
+        with core.HashCache(self.db_path) as cache:
+            with open(self.path, 'rb') as openf:
+                openf.readline()
+                rest = openf.read()
+                openf.seek(len(self.data) - len(rest))
+                result = core.hash_file(openf, hashlib.md5(), cache=cache)
+            self.assertEqual(result, hashlib.md5(rest).digest())
+
+            hasher = hashlib.md5(b"prefix")
+            with open(self.path, 'rb') as openf:
+                result = core.hash_file(openf, hasher, cache=cache)
+            expected = hashlib.md5(b"prefix" + self.data).digest()
+            self.assertEqual(result, expected)
+
+            self.assertIsNone(cache.get(self.path, 'md5'))
+            self.assertEqual(cache.digest(self.path, 'md5'),
+                             hashlib.md5(self.data).digest())
+
+    def test_binary_file_compare_uses_cache(self):
+        copy = os.path.join(self.tmpdir.name, "copy.csv")
+        shutil.copy(self.path, copy)
+        with core.HashCache(self.db_path) as cache:
+            self.assertEqual(
+                core.binary_file_compare(self.path, copy, cache=cache), 0)
+            self.assertIsNotNone(cache.get(copy, 'md5'))
+
+            data = bytearray(self.data)
+            data[len(data) // 2] ^= 0xFF
+            self._modify(copy, bytes(data))
+            self.assertIn(
+                core.binary_file_compare(self.path, copy, cache=cache),
+                (4, 5))
+
+
+class TestHashFileMulti(unittest.TestCase):
+
+    path = os.path.join(REF_DATA_PATH, "ref_BinaryFileCompare.csv")
+
+    def setUp(self):
+        with open(self.path, 'rb') as openf:
+            self.data = openf.read()
+
+    def test_matches_hashlib(self):
+        names = ('md5', 'sha1', 'sha256')
+        expected = [hashlib.new(name, self.data).digest() for name in names]
+        for blocksize in (1, 4096, 2**20):
+            with self.subTest(blocksize=blocksize):
+                with open(self.path, 'rb') as openf:
+                    result = core.hash_file_multi(openf, names, blocksize)
+                self.assertEqual(result, expected)
+
+    def test_path_and_hasher_objects(self):
+        hashers = [hashlib.md5(), hashlib.sha256()]
+        result = core.hash_file_multi(self.path, hashers)
+        self.assertEqual(result, [hasher.digest() for hasher in hashers])
+        self.assertEqual(result[1], hashlib.sha256(self.data).digest())
+
+    def test_single_hasher(self):
+        result = core.hash_file_multi(io.BytesIO(self.data), ['sha256'])
+        self.assertEqual(result, [hashlib.sha256(self.data).digest()])
+
+    def test_partially_read_stream(self):
+        expected = hashlib.sha256(self.data[6:]).digest()
+        for hasher_names in (['sha256'], ['sha256', 'md5']):
+            with self.subTest(hashers=hasher_names):
+                stream = io.BytesIO(self.data)
+                stream.read(6)
+                result = core.hash_file_multi(stream, hasher_names)
+                self.assertEqual(result[0], expected)
+                self.assertEqual(stream.read(), b"")
+
+        stream = io.BytesIO(self.data)
+        stream.read(6)
+        self.assertEqual(core.hash_file(stream, hashlib.sha256()), expected)
+
+    def test_empty(self):
+        result = core.hash_file_multi(io.BytesIO(b""), ['md5', 'sha1'])
+        self.assertEqual(result, [hashlib.md5().digest(),
+                                  hashlib.sha1().digest()])
+
 
 class Test_Integrate(unittest.TestCase):
 
@@ -553,6 +1535,43 @@ class TestReedholmDieNameToRC(unittest.TestCase):
                 self.assertEqual(core.reedholm_die_to_rc(val), expected)
 
 
+class TestReedholmDiesToRC(unittest.TestCase):
+    """ Tests the bulk reedholm_dies_to_rc and rc_to_reedholm_dies """
+
+    def test_matches_single_parser(self):
+        names = [n for n, _ in TestReedholmDieNameToRC.known_values] * 3
+        rows, cols = core.reedholm_dies_to_rc(names)
+        expected = [core.reedholm_die_to_rc(n) for n in names]
+        self.assertEqual(list(zip(rows.tolist(), cols.tolist())), expected)
+
+    def test_ndarray_input(self):
+        rows, cols = core.reedholm_dies_to_rc(np.array(["x1y2", "x3y4"]))
+        self.assertEqual(rows.tolist(), [2, 4])
+        self.assertEqual(cols.tolist(), [1, 3])
+
+    def test_empty(self):
+        rows, cols = core.reedholm_dies_to_rc([])
+        self.assertEqual(rows.shape, (0, ))
+        self.assertEqual(cols.shape, (0, ))
+
+    def test_invalid_name_raises_value_error(self):
+        for name in ("x1y2y", "y1x2", "x1y2a", "x-y3", "1y2", "x1 y2",
+                     "", "x1y1\nx2y2"):
+            with self.subTest(name=name):
+                with self.assertRaises(ValueError):
+                    core.reedholm_dies_to_rc(["x0y0", name])
+
+    def test_round_trip(self):
+        rows = np.array([54, 3, -99, 0])
+        cols = np.array([27, -1, -10, 123])
+        names = core.rc_to_reedholm_dies(rows, cols)
+        self.assertEqual(names.tolist(),
+                         ["x27y54", "x-1y3", "x-10y-99", "x123y0"])
+        new_rows, new_cols = core.reedholm_dies_to_rc(names)
+        np.testing.assert_array_equal(rows, new_rows)
+        np.testing.assert_array_equal(cols, new_cols)
+
+
 class TestRCtoRadius(unittest.TestCase):
     """ Tests the rc_to_radius function """
     # ((r_coord, c_coord), (die_x, die_y), (center_x, center_y), expected)
@@ -565,6 +1584,62 @@ class TestRCtoRadius(unittest.TestCase):
             self.assertAlmostEqual(expected, result)
 
 
+class TestDieCoordinateSystem(unittest.TestCase):
+
+    die_xy = (2.43, 3.3)
+    center_rc = (18, 4)
+
+    def setUp(self):
+        rows, cols = np.mgrid[0:30, 0:20]
+        self.rows = rows.ravel()
+        self.cols = cols.ravel()
+
+    def test_radius_matches_rc_to_radius(self):
+        dcs = core.DieCoordinateSystem(self.die_xy, self.center_rc, 30,
+                                       flip_x=True)
+        radius, _ = dcs.grid_to_polar(self.rows, self.cols)
+        expected = [core.rc_to_radius(rc, self.die_xy, self.center_rc)
+                    for rc in zip(self.rows, self.cols)]
+        np.testing.assert_allclose(radius, expected, atol=1e-12)
+
+    def test_matches_gross_die_per_wafer(self):
+        _, mask, center_rc = core.gross_die_per_wafer((5, 5), 100, 5, 5)
+        dcs = core.DieCoordinateSystem((5, 5), center_rc)
+        rows, cols = np.nonzero(mask)
+        x, y = dcs.grid_to_mm(rows, cols)
+        self.assertTrue(np.all(y - 2.5 >= -47.28 + 5))
+
+    def test_orientation_and_flips(self):
+        dcs = core.DieCoordinateSystem((1, 1), (0, 0), orientation=90)
+        x, y = dcs.grid_to_mm(0, 1)
+        np.testing.assert_allclose((x, y), (0, 1), atol=1e-12)
+        dcs = core.DieCoordinateSystem((1, 1), (0, 0), flip_x=True)
+        np.testing.assert_allclose(dcs.grid_to_mm(1, 1), (-1, -1))
+        dcs = core.DieCoordinateSystem((1, 1), (0, 0), flip_y=True)
+        np.testing.assert_allclose(dcs.grid_to_mm(1, 1), (1, 1))
+
+    def test_round_trips(self):
+        dcs = core.DieCoordinateSystem(self.die_xy, self.center_rc, 45,
+                                       flip_y=True, tester_origin_rc=(3, 7))
+        grid = (self.rows, self.cols)
+        np.testing.assert_allclose(dcs.mm_to_grid(*dcs.grid_to_mm(*grid)),
+                                   grid, atol=1e-9)
+        np.testing.assert_allclose(
+            dcs.polar_to_grid(*dcs.grid_to_polar(*grid)), grid, atol=1e-9)
+        tester = dcs.grid_to_tester(*grid)
+        np.testing.assert_array_equal(dcs.tester_to_grid(*tester), grid)
+        np.testing.assert_allclose(dcs.mm_to_tester(*dcs.tester_to_mm(
+            *tester)), tester, atol=1e-9)
+
+    def test_tester_matches_reedholm(self):
+        dcs = core.DieCoordinateSystem(self.die_xy)
+        x, y = dcs.grid_to_tester(self.rows, self.cols)
+        names = core.rc_to_reedholm_dies(y, x)
+        rows, cols = core.reedholm_dies_to_rc(names)
+        np.testing.assert_array_equal(rows, self.rows)
+        np.testing.assert_array_equal(cols, self.cols)
+
+
 #@unittest.skip("Skipped")
 class TestBinaryFileCompare(unittest.TestCase):
     """ Tests the binary_file_compare function """
@@ -591,6 +1666,404 @@ class TestBinaryFileCompare(unittest.TestCase):
                                              path)
             self.assertNotEqual(match, 0)
 
+    def test_mmap_mode(self):
+        match = core.binary_file_compare(self.ref_file_path,
+                                         self.ref_file_path, mode='mmap',
+                                         chunk_size=4096)
+        self.assertEqual(match, 0)
+        for name in self.bad_file:
+            with self.subTest(name=name):
+                path = os.path.join(REF_DATA_PATH, name)
+                match = core.binary_file_compare(self.ref_file_path, path,
+                                                 mode='mmap',
+                                                 chunk_size=4096)
+                self.assertNotEqual(match, 0)
+
+    def test_mmap_mode_finds_single_byte_difference(self):
+        with open(self.ref_file_path, 'rb') as openf:
+            data = bytearray(openf.read())
+        data[len(data) // 2] ^= 0xFF
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "diff.csv")
+            with open(path, 'wb') as openf:
+                openf.write(data)
+            for mode in ('hash', 'mmap'):
+                with self.subTest(mode=mode):
+                    match = core.binary_file_compare(self.ref_file_path,
+                                                     path, mode=mode)
+                    # The random sample may or may not hit the byte.
+                    self.assertIn(match, (4, 5))
+
+    def test_random_sample_finds_scattered_differences(self):
+        with open(self.ref_file_path, 'rb') as openf:
+            data = np.frombuffer(openf.read(), dtype=np.uint8).copy()
+        data[1:-1:7] ^= 0xFF
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "diff.csv")
+            with open(path, 'wb') as openf:
+                openf.write(data.tobytes())
+            for mode in ('hash', 'mmap'):
+                with self.subTest(mode=mode):
+                    match = core.binary_file_compare(self.ref_file_path,
+                                                     path, mode=mode)
+                    self.assertEqual(match, 4)
+
+    def test_modes_check_the_same_sample(self):
+        with open(self.ref_file_path, 'rb') as openf:
+            data = bytearray(openf.read())
+        data[len(data) // 2] ^= 0xFF
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "diff.csv")
+            with open(path, 'wb') as openf:
+                openf.write(data)
+            for seed in range(5):
+                results = []
+                for mode in ('hash', 'mmap'):
+                    random.seed(seed)
+                    results.append(core.binary_file_compare(
+                        self.ref_file_path, path, mode=mode))
+                with self.subTest(seed=seed):
+                    self.assertEqual(results[0], results[1])
+
+    def test_spot_check_only_compares_offsets(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, name) for name in "ab"]
+            for path, middle in zip(paths, (b"x", b"y")):
+                with open(path, 'wb') as openf:
+                    openf.write(b"0123" + middle + b"5678")
+            with open(paths[0], 'rb') as file1, \
+                    open(paths[1], 'rb') as file2:
+                offsets = np.array([0, 3, 5, 8])
+                self.assertTrue(core._spot_check(file1, file2, offsets))
+                offsets = np.array([0, 4, 8])
+                self.assertFalse(core._spot_check(file1, file2, offsets))
+
+    def test_invalid_mode_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            core.binary_file_compare(self.ref_file_path, self.ref_file_path,
+                                     mode='bogus')
+
+
+class TestCompareFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ref_path = os.path.join(REF_DATA_PATH,
+                                     "ref_BinaryFileCompare.csv")
+        with open(self.ref_path, 'rb') as openf:
+            self.ref_data = openf.read()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, data, name="other.csv"):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wb') as openf:
+            openf.write(data)
+        return path
+
+    @staticmethod
+    def _brute_force_ranges(data1, data2):
+        ranges = []
+        for i in range(max(len(data1), len(data2))):
+            if i >= min(len(data1), len(data2)) or data1[i] != data2[i]:
+                if ranges and ranges[-1][1] == i:
+                    ranges[-1] = (ranges[-1][0], i + 1)
+                else:
+                    ranges.append((i, i + 1))
+        return ranges
+
+    def test_identical(self):
+        result = core.compare_files(self.ref_path, self.ref_path, 10)
+        self.assertEqual(result, (None, [], False))
+
+    def test_reference_files(self):
+        names = ("ref_BinaryFileCompare_start_diff.csv",
+                 "ref_BinaryFileCompare_size_diff.csv",
+                 "ref_BinaryFileCompare_end_diff.csv",
+                 "ref_BinaryFileCompare_1byte_diff.csv",
+                 "ref_BinaryFileCompare_2nd_to_last_diff.csv",
+                 )
+        for name in names:
+            with self.subTest(name=name):
+                path = os.path.join(REF_DATA_PATH, name)
+                with open(path, 'rb') as openf:
+                    expected = self._brute_force_ranges(self.ref_data,
+                                                         openf.read())
+                first, ranges, truncated = core.compare_files(
+                    self.ref_path, path, max_ranges=100, chunk_size=1000)
+                self.assertEqual(ranges, expected)
+                self.assertEqual(first, expected[0][0])
+                self.assertFalse(truncated)
+
+    def test_ranges_match_brute_force(self):
+        rng = np.random.RandomState(0)
+        data = np.frombuffer(self.ref_data, dtype=np.uint8).copy()
+        changed = rng.choice(len(data), 500, replace=False)
+        # Differences that touch chunk boundaries must be coalesced.
+        changed = np.concatenate([changed, [4095, 4096, 4097, 8191]])
+        data[changed] ^= 0x55
+        path = self._write(data.tobytes() + b"extra")
+        expected = self._brute_force_ranges(self.ref_data, data.tobytes()
+                                            + b"extra")
+        first, ranges, truncated = core.compare_files(
+            self.ref_path, path, max_ranges=len(expected), chunk_size=4096)
+        self.assertEqual(ranges, expected)
+        self.assertEqual(first, expected[0][0])
+        self.assertFalse(truncated)
+
+        first, ranges, truncated = core.compare_files(
+            self.ref_path, path, max_ranges=10, chunk_size=4096)
+        self.assertEqual(ranges, expected[:10])
+        self.assertTrue(truncated)
+
+    def test_first_diff_only(self):
+        data = bytearray(self.ref_data)
+        data[12345] ^= 0xFF
+        data[200000] ^= 0xFF
+        path = self._write(bytes(data))
+        result = core.compare_files(self.ref_path, path, chunk_size=4096)
+        self.assertEqual(result, (12345, [], True))
+
+    def test_prefix_file(self):
+        path = self._write(self.ref_data[:1000])
+        result = core.compare_files(self.ref_path, path, max_ranges=5)
+        self.assertEqual(result, (1000, [(1000, len(self.ref_data))], False))
+
+    def test_empty_files(self):
+        empty = self._write(b"", "empty.csv")
+        self.assertEqual(core.compare_files(empty, empty), (None, [], False))
+        result = core.compare_files(empty, self.ref_path, max_ranges=1)
+        self.assertEqual(result, (0, [(0, len(self.ref_data))], False))
+
+
+class TestCompareTrees(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir1 = os.path.join(self.tmpdir.name, "master")
+        self.dir2 = os.path.join(self.tmpdir.name, "copy")
+        files1 = {"same.csv": b"1,2,3\n" * 100,
+                  "empty.csv": b"",
+                  os.path.join("sub", "same.csv"): b"a" * 5000,
+                  os.path.join("sub", "differ.csv"): b"a" * 5000,
+                  "resized.csv": b"abc",
+                  "missing.csv": b"gone",
+                  }
+        files2 = dict(files1)
+        del files2["missing.csv"]
+        files2[os.path.join("sub", "differ.csv")] = b"a" * 4999 + b"b"
+        files2["resized.csv"] = b"abcd"
+        files2[os.path.join("sub", "deeper", "extra.csv")] = b"new"
+        for root, files in ((self.dir1, files1), (self.dir2, files2)):
+            for name, data in files.items():
+                path = os.path.join(root, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as openf:
+                    openf.write(data)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_statuses(self):
+        expected = {"same.csv": 'same',
+                    "empty.csv": 'same',
+                    os.path.join("sub", "same.csv"): 'same',
+                    os.path.join("sub", "differ.csv"): 'differ',
+                    "resized.csv": 'differ',
+                    "missing.csv": 'missing',
+                    os.path.join("sub", "deeper", "extra.csv"): 'extra',
+                    }
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                results = list(core.compare_trees(self.dir1, self.dir2,
+                                                  max_workers=max_workers,
+                                                  max_pending=1))
+                self.assertEqual(len(results), len(expected))
+                self.assertEqual(dict(results), expected)
+
+    def test_shallow_trusts_size_and_mtime(self):
+        name = os.path.join("sub", "differ.csv")
+        stat = os.stat(os.path.join(self.dir1, name))
+        os.utime(os.path.join(self.dir2, name),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        deep = dict(core.compare_trees(self.dir1, self.dir2))
+        shallow = dict(core.compare_trees(self.dir1, self.dir2,
+                                          shallow=True))
+        self.assertEqual(deep[name], 'differ')
+        self.assertEqual(shallow[name], 'same')
+
+    def test_symlink_loop(self):
+        for root in (self.dir1, self.dir2):
+            sub = os.path.join(root, "sub")
+            os.symlink(sub, os.path.join(sub, "loop"))
+        results = dict(core.compare_trees(self.dir1, self.dir2))
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results[os.path.join("sub", "same.csv")], 'same')
+
+    def test_unlistable_folder(self):
+        scandir = os.scandir
+        unlistable = os.path.join(self.dir2, "sub")
+
+        def failing_scandir(path):
+            if os.path.normpath(path) == unlistable:
+                raise PermissionError(path)
+            return scandir(path)
+
+        with patch.object(os, 'scandir', failing_scandir):
+            results = dict(core.compare_trees(self.dir1, self.dir2))
+        self.assertEqual(results, {"sub": 'error',
+                                   "same.csv": 'same',
+                                   "empty.csv": 'same',
+                                   "resized.csv": 'differ',
+                                   "missing.csv": 'missing',
+                                   })
+
+    def test_unreadable_file(self):
+        results = core.compare_trees(self.dir1, self.dir2)
+        self.assertEqual(next(results), ("missing.csv", 'missing'))
+        # The trees have been scanned, so this file vanishes mid-compare.
+        os.remove(os.path.join(self.dir2, "same.csv"))
+        results = dict(results)
+        self.assertEqual(results["same.csv"], 'error')
+        self.assertEqual(results[os.path.join("sub", "same.csv")], 'same')
+
+    def test_stop_early(self):
+        results = core.compare_trees(self.dir1, self.dir2)
+        self.assertEqual(next(results), ("missing.csv", 'missing'))
+        results.close()
+
+
+class TestFindDuplicates(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        big = rng.bytes(50000)
+        # Same size, head, and tail as ``big`` but different middle bytes.
+        big_middle = big[:25000] + b"x" + big[25001:]
+        files = {"a.csv": big,
+                 os.path.join("sub", "a_copy.csv"): big,
+                 os.path.join("sub", "deeper", "a_copy2.csv"): big,
+                 "a_middle.csv": big_middle,
+                 "small.csv": b"1,2,3",
+                 os.path.join("sub", "small_copy.csv"): b"1,2,3",
+                 "small_other.csv": b"1,2,4",
+                 "unique.csv": b"only one of these",
+                 "empty1.csv": b"",
+                 "empty2.csv": b"",
+                 }
+        for name, data in files.items():
+            path = os.path.join(self.tmpdir.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as openf:
+                openf.write(data)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _path(self, *names):
+        return os.path.join(self.tmpdir.name, *names)
+
+    def test_groups(self):
+        expected = [sorted([self._path("a.csv"),
+                            self._path("sub", "a_copy.csv"),
+                            self._path("sub", "deeper", "a_copy2.csv")]),
+                    sorted([self._path("small.csv"),
+                            self._path("sub", "small_copy.csv")]),
+                    ]
+        for partial_size in (16, 4096, 10**6):
+            with self.subTest(partial_size=partial_size):
+                result = list(core.find_duplicates([self.tmpdir.name],
+                                                   partial_size,
+                                                   max_workers=2))
+                self.assertEqual(sorted(result), sorted(expected))
+
+    def test_min_size(self):
+        result = list(core.find_duplicates([self.tmpdir.name], min_size=0))
+        self.assertIn([self._path("empty1.csv"), self._path("empty2.csv")],
+                      result)
+        result = list(core.find_duplicates([self.tmpdir.name],
+                                           min_size=100))
+        self.assertEqual(len(result), 1)
+
+    def test_files_and_overlapping_roots(self):
+        paths = [self._path("small.csv"), self._path("sub"),
+                 self._path("sub", "small_copy.csv")]
+        result = list(core.find_duplicates(paths))
+        expected = [sorted([self._path("small.csv"),
+                            self._path("sub", "small_copy.csv")]),
+                    sorted([self._path("sub", "a_copy.csv"),
+                            self._path("sub", "deeper", "a_copy2.csv")]),
+                    ]
+        self.assertEqual(sorted(result), sorted(expected))
+
+    def test_cache(self):
+        db_path = os.path.join(self.tmpdir.name, "hashes.sqlite")
+        with core.HashCache(db_path) as cache:
+            result = list(core.find_duplicates([self.tmpdir.name],
+                                               partial_size=16,
+                                               algorithm='md5', cache=cache))
+            self.assertIsNotNone(cache.get(self._path("a.csv"), 'md5'))
+        self.assertEqual(len(result), 2)
+
+    def test_links_are_not_duplicates(self):
+        os.link(self._path("unique.csv"), self._path("hard.csv"))
+        os.symlink(self._path("sub"), self._path("sub_link"))
+        os.symlink(self._path("sub"), self._path("sub", "deeper", "loop"))
+        expected = [sorted([self._path("a.csv"),
+                            self._path("sub", "a_copy.csv"),
+                            self._path("sub", "deeper", "a_copy2.csv")]),
+                    sorted([self._path("small.csv"),
+                            self._path("sub", "small_copy.csv")]),
+                    ]
+        paths = [self.tmpdir.name, self._path("sub_link")]
+        result = list(core.find_duplicates(paths))
+        self.assertEqual(sorted(result), sorted(expected))
+
+    def test_unreadable_files_are_skipped(self):
+        unreadable = {self._path("sub", "small_copy.csv"),
+                      self._path("sub", "deeper", "a_copy2.csv")}
+
+        def digest(func):
+            def wrapper(path, *args):
+                if path in unreadable:
+                    raise FileNotFoundError(path)
+                return func(path, *args)
+            return wrapper
+
+        big = [self._path("a.csv"), self._path("sub", "a_copy.csv")]
+        small = [self._path("small.csv"),
+                 self._path("sub", "small_copy.csv")]
+        # Small files are never fully hashed.
+        known_values = (('_partial_digest', [big]),
+                        ('_full_digest', [big, small]),
+                        )
+        for stage, expected in known_values:
+            with self.subTest(stage=stage):
+                with patch.object(core, stage,
+                                  digest(getattr(core, stage))):
+                    result = list(core.find_duplicates([self.tmpdir.name],
+                                                       partial_size=16))
+                self.assertEqual(sorted(result), sorted(expected))
+
+    def test_small_files_are_not_held_up_by_large_ones(self):
+        released = threading.Event()
+        partial_digest = core._partial_digest
+
+        def slow_partial_digest(path, size, *args):
+            if size > 100 and not released.wait(10):
+                raise AssertionError("Small files waited for large ones.")
+            return partial_digest(path, size, *args)
+
+        with patch.object(core, '_partial_digest', slow_partial_digest):
+            groups = core.find_duplicates([self.tmpdir.name], max_workers=2)
+            self.assertEqual(next(groups),
+                             [self._path("small.csv"),
+                              self._path("sub", "small_copy.csv")])
+            released.set()
+            self.assertEqual(len(list(groups)), 1)
+
 
 class TestSignificantSampleSize(unittest.TestCase):
     """ Significant Sample Size """
@@ -666,3 +2139,37 @@ class TestConvertRcdXyd(unittest.TestCase):
             with self.subTest(rcd=rcd, expected=expected):
                 result = core.convert_rcd_xyd(rcd)
                 self.assertEqual(expected, result)
+
+
+class TestConvertRcdXydRecordArray(unittest.TestCase):
+
+    dtype = [('row', int), ('col', int), ('data', float)]
+
+    def setUp(self):
+        self.rcd = np.array([(1, 2, 0.5), (3, 0, 1.5), (0, 2, 2.5)],
+                            dtype=self.dtype)
+
+    def test_view_shares_memory(self):
+        xyd = core.convert_rcd_xyd(self.rcd, sort=False)
+        self.assertTrue(np.shares_memory(xyd, self.rcd))
+        self.assertEqual(xyd.dtype.names, ('col', 'row', 'data'))
+        self.assertEqual(xyd[0].tolist(), (2, 1, 0.5))
+
+    def test_sorted(self):
+        xyd = core.convert_rcd_xyd(self.rcd)
+        expected = [(0, 3, 1.5), (2, 0, 2.5), (2, 1, 0.5)]
+        self.assertEqual(xyd.tolist(), expected)
+
+    def test_round_trip(self):
+        xyd = core.convert_rcd_xyd(self.rcd, sort=False)
+        rcd = core.convert_rcd_xyd(xyd, sort=False)
+        self.assertEqual(rcd.dtype.names, self.rcd.dtype.names)
+        self.assertEqual(rcd.tolist(), self.rcd.tolist())
+
+    def test_sort_order_is_cached(self):
+        order = core.xyd_sort_order(self.rcd)
+        self.assertIs(order, core.xyd_sort_order(self.rcd))
+
+    def test_list_unsorted(self):
+        result = core.convert_rcd_xyd([(3, 4, "b"), (1, 2, "a")], sort=False)
+        self.assertEqual(result, [(4, 3, "b"), (2, 1, "a")])